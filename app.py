@@ -1,12 +1,28 @@
+import os
+
+# Socket.IO async mode: eventlet enables the WebSocket transport (threading
+# falls back to long-polling). Monkey patching must happen before other imports.
+SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet')
+if SOCKETIO_ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
 from flask import Flask, request, render_template, jsonify, session
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from flask_socketio import SocketIO, emit, join_room, leave_room
-import os
 import logging
 from werkzeug.utils import secure_filename
-from config import Config
-from datetime import datetime
+from config import Config, validate_config
+from datetime import datetime, timezone
+from collections import OrderedDict, deque
 import uuid
-import asyncio
+import atexit
+import hashlib
+import tempfile
+import threading
+import orjson
+from ulid import ULID
 
 # Ensure required directories exist before logging
 os.makedirs('logs', exist_ok=True)
@@ -30,17 +46,43 @@ except Exception as e:
 
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config.from_object(Config)
+class OrjsonProvider(JSONProvider):
+    """jsonify via orjson (C encoder; datetimes serialize natively)."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS).decode()
 
-# Initialize SocketIO with threading to avoid async_mode issues
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-# Import services after app/config set
-from services.auth import get_managed_identity_credential
-from services.document_intelligence import DocumentIntelligenceService
-from services.openai_chat import OpenAIChatService
-from services.agents_orchestrator import AgentsOrchestrator
+app = Flask(__name__)
+app.config.from_object(Config)
+app.json = OrjsonProvider(app)
+Compress(app)
+
+# Chat sessions: Redis when REDIS_URL is set (shared across workers), else in-memory
+from services.session_store import create_chat_session_store, RedisChatSessionStore
+chat_store = create_chat_session_store(Config.REDIS_URL, Config.CHAT_SESSION_TIMEOUT, Config.MAX_CHAT_HISTORY)
+if isinstance(chat_store, RedisChatSessionStore):
+    # Server-side Flask sessions so the cookie only carries a sid
+    from flask_session import Session
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = chat_store.client
+    app.config['PERMANENT_SESSION_LIFETIME'] = Config.CHAT_SESSION_TIMEOUT
+    Session(app)
+
+# Redis message queue lets any worker emit to rooms joined on another worker
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=SOCKETIO_ASYNC_MODE,
+                    message_queue=Config.SOCKETIO_MESSAGE_QUEUE)
+
+# Orchestrator coroutines run on one long-lived event loop in a background thread,
+# so async clients/connection pools survive across requests
+ORCHESTRATOR_TIMEOUT = 60
+# (a real OS thread even under eventlet, see services/loop_thread.py)
+from services.loop_thread import start_loop_thread, run_in_loop
+_orchestrator_loop, _ = start_loop_thread("orchestrator-loop")
+
+def run_orchestrator(coro, timeout=ORCHESTRATOR_TIMEOUT):
+    return run_in_loop(_orchestrator_loop, coro, timeout)
 
 # New data layer: prefer MCP client, fallback to direct SQLite
 data_service = None
@@ -50,47 +92,98 @@ try:
     logger.info("Using MCPBankDataService (MCP over SQLite).")
 except Exception as e:
     logger.warning(f"MCP client not available or failed to start: {e}")
-    from services.sqlite_data import SqliteBankDataService
+    from services.sqlite_data import SqliteBankDataService, close_pool
     data_service = SqliteBankDataService(db_path=Config.SQLITE_DB_PATH)
+    atexit.register(close_pool)
     logger.info("Falling back to SqliteBankDataService (direct SQLite).")
 
-# Initialize Azure services
+# Checkpoint WAL + refresh planner stats (the MCP server does this on its own startup)
+if hasattr(data_service, 'run_maintenance'):
+    try:
+        data_service.run_maintenance()
+    except Exception as e:
+        logger.warning(f"SQLite maintenance failed: {e}")
+
+# Azure services are initialized lazily on first use, so worker start-up
+# makes no network calls (and a failing probe can't block --preload)
 credential = None
 doc_intelligence = None
 chat_service = None
 agents_orchestrator = None
+_services_ready = False
+_services_lock = threading.Lock()
 
-try:
-    logger.info("Initializing Azure Managed Identity credential...")
-    credential = get_managed_identity_credential()
-    logger.info("Managed identity credential obtained")
-
-    logger.info("Initializing Document Intelligence service...")
-    doc_intelligence = DocumentIntelligenceService(credential)
-    logger.info("Document Intelligence initialized")
-
-    logger.info("Initializing Azure OpenAI Chat service...")
-    chat_service = OpenAIChatService(credential)
-    test = chat_service.test_connection()
-    if test.get('success'):
-        logger.info("Azure OpenAI connection test successful")
-    else:
-        logger.warning(f"Azure OpenAI connection test failed: {test.get('error')}")
-except Exception as e:
-    logger.error(f"Service initialization failed: {e}")
-
-try:
-    logger.info("Initializing Agents Orchestrator...")
-    agents_orchestrator = AgentsOrchestrator(chat_service, data_service, doc_intelligence)
-    logger.info("Agents Orchestrator ready")
-except Exception as e:
-    logger.error(f"Failed to init orchestrator: {e}")
-
-# In-memory sessions (use Redis in production)
-chat_sessions = {}
+def _close_chat_service():
+    # The async OpenAI client's pool belongs to the orchestrator loop, so close it there
+    try:
+        run_orchestrator(chat_service.aclose(), timeout=5)
+    except Exception as e:
+        logger.warning(f"Closing chat service failed: {e}")
+
+def _init_services():
+    global credential, doc_intelligence, chat_service, agents_orchestrator, _services_ready
+    if _services_ready:
+        return
+    with _services_lock:
+        if _services_ready:
+            return
+        from services.auth import get_managed_identity_credential
+        from services.document_intelligence import DocumentIntelligenceService
+        from services.openai_chat import OpenAIChatService
+        from services.agents_orchestrator import AgentsOrchestrator
+
+        try:
+            logger.info("Initializing Azure Managed Identity credential...")
+            credential = get_managed_identity_credential()
+            logger.info("Managed identity credential obtained")
+
+            logger.info("Initializing Document Intelligence service...")
+            doc_intelligence = DocumentIntelligenceService(credential)
+            logger.info("Document Intelligence initialized")
+
+            logger.info("Initializing Azure OpenAI Chat service...")
+            chat_service = OpenAIChatService(credential)
+            atexit.register(_close_chat_service)
+            logger.info("Azure OpenAI Chat service initialized")
+        except Exception as e:
+            logger.error(f"Service initialization failed: {e}")
+
+        try:
+            logger.info("Initializing Agents Orchestrator...")
+            agents_orchestrator = AgentsOrchestrator(chat_service, data_service, doc_intelligence)
+            logger.info("Agents Orchestrator ready")
+        except Exception as e:
+            logger.error(f"Failed to init orchestrator: {e}")
+        _services_ready = True
+
+def get_credential():
+    _init_services()
+    return credential
+
+def get_doc_intelligence():
+    _init_services()
+    return doc_intelligence
+
+def get_chat_service():
+    _init_services()
+    return chat_service
+
+def get_agents_orchestrator():
+    _init_services()
+    return agents_orchestrator
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Hot-path settings bound once to module globals
+ALLOWED_EXTS = Config.ALLOWED_EXTENSIONS
+MAX_CONTENT_LENGTH = Config.MAX_CONTENT_LENGTH
+MAX_CHAT_HISTORY = Config.MAX_CHAT_HISTORY
+MAX_SESSION_DOCUMENTS = Config.MAX_SESSION_DOCUMENTS
+UPLOAD_FOLDER = Config.UPLOAD_FOLDER
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    ext = os.path.splitext(filename)[1]
+    return bool(ext) and ext[1:].lower() in ALLOWED_EXTS
 
 def get_session_id():
     if 'session_id' not in session:
@@ -98,25 +191,54 @@ def get_session_id():
     return session['session_id']
 
 def get_chat_session(session_id):
-    if session_id not in chat_sessions:
-        chat_sessions[session_id] = {
-            'messages': [],
-            'documents': [],
+    cs = chat_store.get(session_id)
+    if cs is None:
+        now = datetime.now(timezone.utc)
+        cs = {
+            'messages': deque(maxlen=MAX_CHAT_HISTORY),
+            'last_assistant_meta': None,  # meta of the latest assistant reply that had one
+            'documents': OrderedDict(),  # doc_id -> entry, in upload order
             'selected_document_id': None,
-            'created_at': datetime.utcnow(),
-            'last_activity': datetime.utcnow(),
+            'created_at': now,
+            'last_activity': now,
             'user_id': os.environ.get('DEMO_USER_ID', 'husamhilal')
         }
-    return chat_sessions[session_id]
+        chat_store.save(session_id, cs)
+    return cs
+
+# Field groups written by each path, so a stale copy never overwrites the other group
+CHAT_FIELDS = ('messages', 'last_assistant_meta', 'last_activity')
+DOC_FIELDS = ('documents', 'selected_document_id', 'last_activity')
+
+def update_chat_session(session_id, mutate, fields=None):
+    """Apply mutate(cs) to the current stored session atomically; returns mutate's result."""
+    return chat_store.update(session_id, mutate, fields)
+
+def append_assistant_message(cs, result):
+    meta = result.get('meta', {})
+    cs['messages'].append({
+        'role': 'assistant',
+        'content': result['message'],
+        'timestamp': result['timestamp'],
+        'meta': meta,
+        'content_type': result.get('content_type', 'text')
+    })
+    if meta:
+        cs['last_assistant_meta'] = meta
+
+def _evict_old_documents(cs):
+    """Keep at most MAX_SESSION_DOCUMENTS per session, dropping the oldest uploads first."""
+    docs = cs['documents']
+    while len(docs) > MAX_SESSION_DOCUMENTS:
+        docs.popitem(last=False)
+    if cs['selected_document_id'] not in docs:
+        cs['selected_document_id'] = next((d for d in reversed(docs) if docs[d].get('status') == 'ready'), None)
 
 def get_selected_document(chat_session):
     doc_id = chat_session.get('selected_document_id')
     if not doc_id:
         return None
-    for d in chat_session.get('documents', []):
-        if d.get('id') == doc_id:
-            return d
-    return None
+    return chat_session['documents'].get(doc_id)
 
 @app.route('/')
 def index():
@@ -133,16 +255,16 @@ def index():
         pass
 
     services_status = {
-        'document_intelligence': doc_intelligence is not None,
-        'chat_service': chat_service is not None,
-        'credential': credential is not None,
+        'document_intelligence': get_doc_intelligence() is not None,
+        'chat_service': get_chat_service() is not None,
+        'credential': get_credential() is not None,
         'data': data_service is not None
     }
     selected_doc = get_selected_document(cs)
     return render_template('index.html',
                            session_id=session_id,
                            services_status=services_status,
-                           documents=[{'id': d['id'], 'filename': d['filename']} for d in cs['documents']],
+                           documents=[{'id': d['id'], 'filename': d['filename']} for d in cs['documents'].values()],
                            selected_document_id=cs['selected_document_id'],
                            document_summary=selected_doc.get('summary') if selected_doc else None,
                            user_display_name=user_display_name)
@@ -150,9 +272,12 @@ def index():
 # Unified analyze API
 @app.route('/api/analyze', methods=['POST'])
 def api_analyze():
-    if not doc_intelligence:
+    if not get_doc_intelligence():
         return jsonify({'success': False, 'error': 'Document Intelligence service is unavailable'}), 503
     try:
+        # Reject oversize uploads before the multipart body is parsed/buffered
+        if request.content_length is not None and request.content_length > MAX_CONTENT_LENGTH:
+            return jsonify({'success': False, 'error': 'File too large'}), 413
         if 'document' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
 
@@ -163,16 +288,112 @@ def api_analyze():
             return jsonify({'success': False, 'error': 'Invalid file type'}), 400
 
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Read the upload straight from the request (no save/re-read/remove on disk),
+        # hashing as we go so a re-upload of the same file is recognized
+        digest = hashlib.sha256()
+        chunks = []
+        while True:
+            chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            chunks.append(chunk)
+        content = b"".join(chunks)
+        if not content:
+            return jsonify({'success': False, 'error': 'Empty file'}), 400
 
-        logger.info(f"Analyzing document (API): {filename}")
-        results = doc_intelligence.analyze_document(filepath)
+        return _start_document_analysis(filename, content=content, sha256=digest.hexdigest())
+    except Exception as e:
+        logger.error(f"API analyze error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        session_id = get_session_id()
-        cs = get_chat_session(session_id)
-        from uuid import uuid4
-        doc_id = str(uuid4())
+# Raw-body upload: streams request.stream to disk in chunks, bypassing multipart parsing
+@app.route('/api/analyze_stream', methods=['POST'])
+def api_analyze_stream():
+    if not get_doc_intelligence():
+        return jsonify({'success': False, 'error': 'Document Intelligence service is unavailable'}), 503
+    try:
+        raw_name = request.headers.get('X-Filename', '')
+        if not raw_name:
+            return jsonify({'success': False, 'error': 'X-Filename header is required'}), 400
+        if not allowed_file(raw_name):
+            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+        if request.content_length is not None and request.content_length > MAX_CONTENT_LENGTH:
+            return jsonify({'success': False, 'error': 'File too large'}), 413
+
+        filename = secure_filename(raw_name)
+        with tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix=f"-{filename}", delete=False) as tmp:
+            filepath = tmp.name
+        written = 0
+        with open(filepath, 'wb', buffering=0) as out:
+            while True:
+                chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > MAX_CONTENT_LENGTH:
+                    break
+                out.write(chunk)
+        if written > MAX_CONTENT_LENGTH:
+            os.remove(filepath)
+            return jsonify({'success': False, 'error': 'File too large'}), 413
+        if written == 0:
+            os.remove(filepath)
+            return jsonify({'success': False, 'error': 'Empty file'}), 400
+
+        return _start_document_analysis(filename, filepath=filepath)
+    except Exception as e:
+        logger.error(f"API analyze (stream) error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _start_document_analysis(filename, filepath=None, content=None, sha256=None):
+    """Register a placeholder document and process it in the background (202 Accepted)."""
+    session_id = get_session_id()
+    cs = get_chat_session(session_id)
+
+    # Idempotent re-upload: same bytes already analyzed/processing in this session
+    if sha256:
+        existing = next((d for d in cs['documents'].values()
+                         if d.get('sha256') == sha256 and d.get('status') != 'failed'), None)
+        if existing:
+            if filepath and os.path.exists(filepath):
+                os.remove(filepath)
+            if existing.get('status') == 'ready':
+                def _select(cs):
+                    if existing['id'] in cs['documents']:
+                        cs['selected_document_id'] = existing['id']
+                update_chat_session(session_id, _select, DOC_FIELDS)
+            return jsonify({'success': True, 'id': existing['id'], 'filename': existing['filename'],
+                            'summary': existing.get('summary'), 'status': existing.get('status', 'ready'),
+                            'duplicate': True}), (202 if existing.get('status') == 'processing' else 200)
+    # Time-ordered id (doc ids need uniqueness, not unpredictability; session ids stay uuid4)
+    doc_id = str(ULID())
+    now = datetime.now(timezone.utc)
+
+    def _add(cs):
+        cs['documents'][doc_id] = {
+            'id': doc_id,
+            'filename': filename,
+            'data': None,
+            'summary': None,
+            'status': 'processing',
+            'sha256': sha256,
+            'uploaded_at': now.isoformat()
+        }
+        _evict_old_documents(cs)
+        cs['last_activity'] = now
+    update_chat_session(session_id, _add, DOC_FIELDS)
+
+    socketio.start_background_task(_process_document, session_id, doc_id, filename, filepath, content)
+    return jsonify({'success': True, 'id': doc_id, 'filename': filename, 'status': 'processing'}), 202
+
+def _process_document(session_id, doc_id, filename, filepath=None, content=None):
+    try:
+        logger.info(f"Analyzing document (API): {filename}")
+        if content is not None:
+            results = doc_intelligence.analyze_stream(content)
+        else:
+            results = doc_intelligence.analyze_document(filepath)
 
         summary_text = None
         if chat_service:
@@ -180,19 +401,18 @@ def api_analyze():
             if summary.get('success'):
                 summary_text = summary['summary']
 
-        doc_entry = {
-            'id': doc_id,
-            'filename': filename,
-            'data': results,
-            'summary': summary_text,
-            'uploaded_at': datetime.utcnow().isoformat()
-        }
-        cs['documents'].append(doc_entry)
-        cs['selected_document_id'] = doc_id
-        cs['last_activity'] = datetime.utcnow()
-
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        # Applied to the current session: other requests may have updated it meanwhile
+        def _finish(cs):
+            entry = cs['documents'].get(doc_id)
+            if entry is None:
+                return False
+            entry.update({'data': results, 'summary': summary_text, 'status': 'ready'})
+            cs['selected_document_id'] = doc_id
+            cs['last_activity'] = datetime.now(timezone.utc)
+            return True
+        if not update_chat_session(session_id, _finish, DOC_FIELDS):
+            logger.info(f"Document {doc_id} was deleted before processing finished")
+            return
 
         socketio.emit('document_processed', {
             'id': doc_id,
@@ -200,17 +420,23 @@ def api_analyze():
             'summary': summary_text or 'Document processed successfully',
             'has_summary': bool(summary_text)
         }, room=session_id)
-
-        return jsonify({'success': True, 'id': doc_id, 'filename': filename, 'summary': summary_text})
     except Exception as e:
-        logger.error(f"API analyze error: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        logger.error(f"Document processing error: {e}")
+        def _fail(cs):
+            entry = cs['documents'].get(doc_id)
+            if entry is not None:
+                entry['status'] = 'failed'
+        update_chat_session(session_id, _fail, DOC_FIELDS)
+        socketio.emit('document_failed', {'id': doc_id, 'filename': filename, 'error': str(e)}, room=session_id)
+    finally:
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
 
 @app.route('/api/documents', methods=['GET'])
 def list_documents():
     session_id = get_session_id()
     cs = get_chat_session(session_id)
-    docs = [{'id': d['id'], 'filename': d['filename'], 'uploaded_at': d['uploaded_at']} for d in cs['documents']]
+    docs = [{'id': d['id'], 'filename': d['filename'], 'uploaded_at': d['uploaded_at']} for d in cs['documents'].values()]
     return jsonify({'success': True, 'documents': docs, 'selected_document_id': cs['selected_document_id']})
 
 @app.route('/api/documents/select', methods=['POST'])
@@ -218,28 +444,35 @@ def select_document():
     data = request.get_json() or {}
     doc_id = data.get('id')
     session_id = get_session_id()
-    cs = get_chat_session(session_id)
-    if not doc_id or doc_id not in [d['id'] for d in cs['documents']]:
+    get_chat_session(session_id)
+
+    def _select(cs):
+        if not doc_id or doc_id not in cs['documents']:
+            return False
+        cs['selected_document_id'] = doc_id
+        cs['last_activity'] = datetime.now(timezone.utc)
+        return True
+    if not update_chat_session(session_id, _select, DOC_FIELDS):
         return jsonify({'success': False, 'error': 'Invalid document id'}), 400
-    cs['selected_document_id'] = doc_id
-    cs['last_activity'] = datetime.utcnow()
     return jsonify({'success': True, 'selected_document_id': doc_id})
 
 @app.route('/api/documents/<doc_id>', methods=['DELETE'])
 def delete_document(doc_id):
     session_id = get_session_id()
-    cs = get_chat_session(session_id)
-    before = len(cs['documents'])
-    cs['documents'] = [d for d in cs['documents'] if d['id'] != doc_id]
-    if cs['selected_document_id'] == doc_id:
-        cs['selected_document_id'] = cs['documents'][0]['id'] if cs['documents'] else None
-    after = len(cs['documents'])
-    cs['last_activity'] = datetime.utcnow()
-    return jsonify({'success': True, 'deleted': before - after, 'selected_document_id': cs['selected_document_id']})
+    get_chat_session(session_id)
+
+    def _delete(cs):
+        removed = cs['documents'].pop(doc_id, None)
+        if cs['selected_document_id'] == doc_id:
+            cs['selected_document_id'] = next(iter(cs['documents']), None)
+        cs['last_activity'] = datetime.now(timezone.utc)
+        return removed is not None, cs['selected_document_id']
+    removed, selected = update_chat_session(session_id, _delete, DOC_FIELDS)
+    return jsonify({'success': True, 'deleted': 1 if removed else 0, 'selected_document_id': selected})
 
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
-    if not agents_orchestrator:
+    if not get_agents_orchestrator():
         return jsonify({'error': 'Agents orchestrator is unavailable'}), 503
     try:
         data = request.get_json() or {}
@@ -252,42 +485,32 @@ def api_chat():
         selected_doc = get_selected_document(cs)
 
         # Persist user message
-        cs['messages'].append({'role': 'user', 'content': message, 'timestamp': datetime.utcnow().isoformat()})
+        now = datetime.now(timezone.utc)
+        user_msg = {'role': 'user', 'content': message, 'timestamp': now.isoformat()}
+        update_chat_session(session_id, lambda s: s['messages'].append(user_msg), CHAT_FIELDS)
+
+        def _reply(result):
+            def _append(s):
+                append_assistant_message(s, result)
+                s['last_activity'] = now
+            update_chat_session(session_id, _append, CHAT_FIELDS)
 
         # Try payment confirmation follow-up first
-        last_meta = None
-        for m in reversed(cs['messages']):
-            if m.get('role') == 'assistant' and m.get('meta'):
-                last_meta = m['meta']
-                break
-        followup = asyncio.run(agents_orchestrator.postprocess_followup(cs['user_id'], message, last_meta))
+        last_meta = cs.get('last_assistant_meta')
+        followup = run_orchestrator(agents_orchestrator.postprocess_followup(cs['user_id'], message, last_meta))
         if followup:
-            cs['messages'].append({
-                'role': 'assistant',
-                'content': followup['message'],
-                'timestamp': followup['timestamp'],
-                'meta': followup.get('meta', {}),
-                'content_type': followup.get('content_type', 'text')
-            })
-            cs['last_activity'] = datetime.utcnow()
+            _reply(followup)
             return jsonify({'success': True, 'response': followup['message'], 'timestamp': followup['timestamp'], 'meta': followup.get('meta', {}), 'content_type': followup.get('content_type', 'text')})
 
         # Main orchestration
-        result = asyncio.run(agents_orchestrator.handle_chat(
+        result = run_orchestrator(agents_orchestrator.handle_chat(
             user_id=cs['user_id'],
             message=message,
             document_data=selected_doc['data'] if selected_doc else None
         ))
 
         if result.get('success'):
-            cs['messages'].append({
-                'role': 'assistant',
-                'content': result['message'],
-                'timestamp': result['timestamp'],
-                'meta': result.get('meta', {}),
-                'content_type': result.get('content_type', 'text')
-            })
-            cs['last_activity'] = datetime.utcnow()
+            _reply(result)
             return jsonify({
                 'success': True,
                 'response': result['message'],
@@ -305,9 +528,11 @@ def api_chat():
 def clear_chat():
     try:
         session_id = get_session_id()
-        if session_id in chat_sessions:
-            chat_sessions[session_id]['messages'] = []
-            chat_sessions[session_id]['last_activity'] = datetime.utcnow()
+        def _clear(cs):
+            cs['messages'].clear()
+            cs['last_assistant_meta'] = None
+            cs['last_activity'] = datetime.now(timezone.utc)
+        update_chat_session(session_id, _clear, CHAT_FIELDS)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -321,9 +546,9 @@ def export_chat():
         export_data = {
             'session_id': session_id,
             'selected_document_id': cs['selected_document_id'],
-            'documents': [{'id': d['id'], 'filename': d['filename'], 'uploaded_at': d['uploaded_at']} for d in cs['documents']],
+            'documents': [{'id': d['id'], 'filename': d['filename'], 'uploaded_at': d['uploaded_at']} for d in cs['documents'].values()],
             'created_at': cs['created_at'].isoformat(),
-            'messages': cs['messages'],
+            'messages': list(cs['messages']),
             'document_summary': selected_doc.get('summary') if selected_doc else None
         }
         return jsonify(export_data)
@@ -332,9 +557,10 @@ def export_chat():
 
 @app.route('/health')
 def health():
+    _init_services()
     status = {
         'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
         'services': {
             'credential': credential is not None,
             'document_intelligence': doc_intelligence is not None,
@@ -343,6 +569,12 @@ def health():
             'agents_orchestrator': agents_orchestrator is not None
         }
     }
+    # Azure OpenAI probe (moved here from start-up)
+    if chat_service:
+        test = chat_service.test_connection()
+        status['services']['chat_service_connection'] = bool(test.get('success'))
+        if not test.get('success'):
+            status['chat_service_error'] = test.get('error')
     if not all(status['services'].values()):
         status['status'] = 'degraded'
     return jsonify(status)
@@ -362,7 +594,7 @@ def ws_disconnect():
 
 if __name__ == '__main__':
     try:
-        Config.validate_config()
+        validate_config()
         socketio.run(app,
                      host='0.0.0.0',
                      port=int(os.environ.get('PORT', 5000)),
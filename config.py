@@ -1,42 +1,60 @@
 import os
+from dataclasses import dataclass
+from typing import FrozenSet, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or os.environ.get('FLASK_SECRET_KEY') or 'change-me-in-prod'
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
-    ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@dataclass(frozen=True, slots=True)
+class _Config:
+    """Settings resolved once from the environment at import; immutable afterwards."""
+    SECRET_KEY: str = os.environ.get('SECRET_KEY') or os.environ.get('FLASK_SECRET_KEY') or 'change-me-in-prod'
+    UPLOAD_FOLDER: str = os.path.join(_BASE_DIR, 'uploads')
+    MAX_CONTENT_LENGTH: int = 16 * 1024 * 1024
+    ALLOWED_EXTENSIONS: FrozenSet[str] = frozenset({'pdf', 'png', 'jpg', 'jpeg'})
 
     # Azure Document Intelligence
-    AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT = os.environ.get('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT')
+    AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT: Optional[str] = os.environ.get('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT')
 
     # Azure OpenAI
-    AZURE_OPENAI_ENDPOINT = os.environ.get('AZURE_OPENAI_ENDPOINT')
-    AZURE_OPENAI_API_VERSION = os.environ.get('AZURE_OPENAI_API_VERSION', '2024-02-15-preview')
-    AZURE_OPENAI_CHAT_DEPLOYMENT = os.environ.get('AZURE_OPENAI_CHAT_DEPLOYMENT')
-    AZURE_OPENAI_MAX_TOKENS = int(os.environ.get('AZURE_OPENAI_MAX_TOKENS', '1500'))
-    AZURE_OPENAI_TEMPERATURE = float(os.environ.get('AZURE_OPENAI_TEMPERATURE', '0.7'))
+    AZURE_OPENAI_ENDPOINT: Optional[str] = os.environ.get('AZURE_OPENAI_ENDPOINT')
+    AZURE_OPENAI_API_VERSION: str = os.environ.get('AZURE_OPENAI_API_VERSION', '2024-02-15-preview')
+    AZURE_OPENAI_CHAT_DEPLOYMENT: Optional[str] = os.environ.get('AZURE_OPENAI_CHAT_DEPLOYMENT')
+    AZURE_OPENAI_MAX_TOKENS: int = int(os.environ.get('AZURE_OPENAI_MAX_TOKENS', '1500'))
+    AZURE_OPENAI_TEMPERATURE: float = float(os.environ.get('AZURE_OPENAI_TEMPERATURE', '0.7'))
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT: Optional[str] = os.environ.get('AZURE_OPENAI_EMBEDDING_DEPLOYMENT')
 
     # SQLite (on-prem simulation)
-    SQLITE_DB_PATH = os.environ.get('SQLITE_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'banking.db'))
-
-    MAX_CHAT_HISTORY = int(os.environ.get('MAX_CHAT_HISTORY', '50'))
-    CHAT_SESSION_TIMEOUT = int(os.environ.get('CHAT_SESSION_TIMEOUT', '3600'))
-    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
-
-    @classmethod
-    def validate_config(cls):
-        missing = []
-        required = [
-            'AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT',
-            'AZURE_OPENAI_ENDPOINT',
-            'AZURE_OPENAI_CHAT_DEPLOYMENT',
-        ]
-        for key in required:
-            if not os.environ.get(key):
-                missing.append(key)
-        if missing:
-            raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
-        return True
\ No newline at end of file
+    SQLITE_DB_PATH: str = os.environ.get('SQLITE_DB_PATH', os.path.join(_BASE_DIR, 'data', 'banking.db'))
+
+    # Redis for shared chat sessions (optional; in-memory when unset)
+    REDIS_URL: Optional[str] = os.environ.get('REDIS_URL')
+    SOCKETIO_MESSAGE_QUEUE: Optional[str] = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or os.environ.get('REDIS_URL')
+
+    # Response compression (flask-compress: br/gzip)
+    COMPRESS_MIMETYPES: Tuple[str, ...] = ('application/json', 'text/html')
+    COMPRESS_LEVEL: int = 4
+    COMPRESS_MIN_SIZE: int = 500
+
+    MAX_CHAT_HISTORY: int = int(os.environ.get('MAX_CHAT_HISTORY', '50'))
+    MAX_SESSION_DOCUMENTS: int = int(os.environ.get('MAX_SESSION_DOCUMENTS', '20'))
+    CHAT_SESSION_TIMEOUT: int = int(os.environ.get('CHAT_SESSION_TIMEOUT', '3600'))
+    LOG_LEVEL: str = os.environ.get('LOG_LEVEL', 'INFO')
+
+Config = _Config()
+
+def validate_config():
+    missing = []
+    required = [
+        'AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT',
+        'AZURE_OPENAI_ENDPOINT',
+        'AZURE_OPENAI_CHAT_DEPLOYMENT',
+    ]
+    for key in required:
+        if not os.environ.get(key):
+            missing.append(key)
+    if missing:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+    return True
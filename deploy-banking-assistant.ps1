@@ -38,7 +38,9 @@ $env:FLASK_ENV = "development"
 $env:PORT = "5000"
 $env:LOG_LEVEL = "INFO"
 $env:MAX_CHAT_HISTORY = "50"
+$env:MAX_SESSION_DOCUMENTS = "20"
 $env:CHAT_SESSION_TIMEOUT = "3600"
+# $env:AZURE_OPENAI_EMBEDDING_DEPLOYMENT = "text-embedding-3-small"   # enables the semantic answer cache
 
 Write-Host "Seeding SQLite sample data..." -ForegroundColor Cyan
 python scripts/seed_sqlite.py
@@ -7,10 +7,48 @@ Env:
   COSMOS_DB_NAME (optional, default 'bankingdb')
   COSMOS_CONTAINER_NAME (optional, default 'bank')
 """
+import asyncio
 import os
+import sys
 from datetime import datetime, timedelta, timezone
 from azure.identity import ManagedIdentityCredential
+from azure.identity.aio import ManagedIdentityCredential as AsyncManagedIdentityCredential
 from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.http_transport import get_azure_transport
+
+# Cosmos transactional batches are limited to 100 operations
+MAX_BATCH_OPS = 100
+# Max in-flight deletes during the wipe
+WIPE_CONCURRENCY = 16
+
+_client = None
+
+def get_client(account_uri: str, cred) -> CosmosClient:
+    global _client
+    if _client is None:
+        _client = CosmosClient(account_uri, credential=cred, transport=get_azure_transport(),
+                               enable_endpoint_discovery=False)
+    return _client
+
+async def wipe_user_items(account_uri: str, db_name: str, container_name: str, user_id: str) -> int:
+    """Delete all items for user_id concurrently over one aiohttp connection pool."""
+    async with AsyncManagedIdentityCredential() as cred, AsyncCosmosClient(account_uri, credential=cred) as client:
+        container = client.get_database_client(db_name).get_container_client(container_name)
+        items = [it async for it in container.query_items(
+            query="SELECT c.id, c.userId FROM c WHERE c.userId = @uid",
+            parameters=[{"name": "@uid", "value": user_id}],
+            partition_key=user_id)]
+        sem = asyncio.Semaphore(WIPE_CONCURRENCY)
+
+        async def delete(it):
+            async with sem:
+                await container.delete_item(it['id'], partition_key=it['userId'])
+
+        await asyncio.gather(*(delete(it) for it in items))
+        return len(items)
 
 def main():
     account_uri = os.environ.get('AZURE_COSMOSDB_ACCOUNT_URI')
@@ -21,17 +59,12 @@ def main():
         raise RuntimeError("AZURE_COSMOSDB_ACCOUNT_URI not set")
 
     cred = ManagedIdentityCredential()
-    client = CosmosClient(account_uri, credential=cred)
+    client = get_client(account_uri, cred)
     db = client.create_database_if_not_exists(db_name)
     container = db.create_container_if_not_exists(id=container_name, partition_key=PartitionKey(path="/userId"))
 
     # Wipe existing user data (for demo)
-    items = list(container.query_items(
-        query="SELECT * FROM c WHERE c.userId = @uid",
-        parameters=[{"name":"@uid","value":user_id}],
-        enable_cross_partition_query=True))
-    for it in items:
-        container.delete_item(it, partition_key=it['userId'])
+    asyncio.run(wipe_user_items(account_uri, db_name, container_name, user_id))
 
     # Create user
     user = {
@@ -42,12 +75,11 @@ def main():
         'email': 'husam@example.com',
         'createdAt': datetime.now(timezone.utc).isoformat()
     }
-    container.create_item(user)
 
     # Accounts
     accounts = [
         {
-            'id': 'acc-checking',
+            'id': 'account:CHK-001',
             'type': 'account',
             'userId': user_id,
             'accountId': 'CHK-001',
@@ -56,7 +88,7 @@ def main():
             'balance': 4850.75
         },
         {
-            'id': 'acc-savings',
+            'id': 'account:SAV-001',
             'type': 'account',
             'userId': user_id,
             'accountId': 'SAV-001',
@@ -65,8 +97,6 @@ def main():
             'balance': 15230.00
         }
     ]
-    for a in accounts:
-        container.create_item(a)
 
     # Payees
     payees = [
@@ -89,8 +119,6 @@ def main():
             'address': '88 Fiber St, Metropolis'
         }
     ]
-    for p in payees:
-        container.create_item(p)
 
     # Recent transactions (on checking)
     base_date = datetime.now(timezone.utc)
@@ -101,8 +129,9 @@ def main():
         {'amount': 2500.00, 'merchant': 'Employer Inc.', 'description': 'Salary', 'days': 8, 'category': 'income'},
         {'amount': -12.99, 'merchant': 'StreamingCo', 'description': 'Entertainment', 'days': 10, 'category': 'entertainment'},
     ]
+    tx_items = []
     for i, t in enumerate(txs):
-        item = {
+        tx_items.append({
             'id': f"tx-{i}",
             'type': 'transaction',
             'userId': user_id,
@@ -113,8 +142,12 @@ def main():
             'description': t['description'],
             'merchant': t['merchant'],
             'category': t['category']
-        }
-        container.create_item(item)
+        })
+
+    # Everything shares partition key userId, so create it all in transactional batches
+    batch_ops = [("create", (item,)) for item in [user, *accounts, *payees, *tx_items]]
+    for i in range(0, len(batch_ops), MAX_BATCH_OPS):
+        container.execute_item_batch(batch_ops[i:i + MAX_BATCH_OPS], partition_key=user_id)
 
     print("Seed complete.")
 
@@ -1,10 +1,60 @@
 import logging
 import html
+import re
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
+# Characters html.escape(quote=True) would rewrite; most banking strings contain none
+_HTML_CHARS = re.compile(r'[&<>"\']')
+# Payment amount in free text, e.g. "$1,234.56" or "125"
+_AMOUNT_RE = re.compile(r'(\$?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)')
+# Payee after the first standalone "to", e.g. "Pay $125.50 to ACME Utilities"
+_PAYEE_TO_RE = re.compile(r'\bto\s+(.+)', re.IGNORECASE)
+
+# Keyword intent routing in one case-insensitive scan. Original keywords keep substring
+# semantics ("pay" also covers payment/pay bill/confirm payment); the short informal
+# forms are word-bounded so e.g. "global" doesn't read as "bal". Money-movement verbs
+# only count with an amount or "to <payee>" after them, so general questions ("what is
+# a wire transfer fee?") still reach the LLM. A match is handled locally and skips the
+# LLM round-trip.
+_INTENT_RE = re.compile(
+    r'(?P<balance>balance|how much do i have|how much money|\bbal\b)'
+    r'|(?P<transactions>transactions|history|statement|\btxns?\b|\bpurchases\b|recent activity)'
+    r'|(?P<payment>pay|settle|\b(?:send|transfer|tsfr|xfr|owing)\b(?=.*?(?:\$?\d|\bto\s+\w)))',
+    re.IGNORECASE | re.DOTALL
+)
+
+def classify_intents(message: str) -> set:
+    """All keyword intents present in message; handle_chat applies the priority order."""
+    return {m.lastgroup for m in _INTENT_RE.finditer(message)}
+
+def _pick_checking_account(accounts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """First checking account (account_type lowered once per row), else the first account."""
+    for a in accounts:
+        t = a.get('account_type')
+        if t == 'checking' or (t and str(t).lower() == 'checking'):
+            return a
+    return accounts[0]
+
+# Table templates: rows are formatted from tuples and streamed into one join
+_ACCOUNT_ROW = "<tr><td>{0}</td><td>{1}</td><td class='{2}'>{3}</td></tr>"
+_ACCOUNTS_TABLE = (
+    "<div class='table-responsive'>"
+    "<table class='table table-sm table-striped table-hover align-middle chat-table'>"
+    "<thead><tr><th>Account</th><th>Account ID</th><th>Balance</th></tr></thead>"
+    "<tbody>{rows}</tbody></table></div>"
+)
+_TX_ROW = "<tr><td>{0}</td><td>{1}</td><td>{2}</td><td class='{3} text-end'>{4}</td></tr>"
+_TX_TABLE = (
+    "<div class='mb-2 small text-muted'>Recent transactions for account {account_id}:</div>"
+    "<div class='table-responsive'>"
+    "<table class='table table-sm table-striped table-hover align-middle chat-table'>"
+    "<thead><tr><th style='min-width: 140px;'>Date</th><th style='min-width: 160px;'>Merchant</th><th>Description</th><th class='text-end' style='min-width: 120px;'>Amount</th></tr></thead>"
+    "<tbody>{rows}</tbody></table></div>"
+)
+
 class AgentsOrchestrator:
     """
     Orchestrates multi-agent behavior over banking data layer (MCP over SQLite or direct SQLite).
@@ -17,17 +67,17 @@ class AgentsOrchestrator:
         self.az_agents_available = False  # reserved for future azure-ai-agents integration
 
     async def handle_chat(self, user_id: str, message: str, document_data: Optional[Dict] = None) -> Dict[str, Any]:
-        low = message.lower()
         try:
-            if any(k in low for k in ["balance", "account balance", "how much do i have"]):
+            intents = classify_intents(message)
+            if 'balance' in intents:
                 return await self._handle_balance(user_id, message)
-            if any(k in low for k in ["transactions", "recent transactions", "history", "statement"]):
+            if 'transactions' in intents:
                 return await self._handle_transactions(user_id, message)
-            if any(k in low for k in ["pay", "payment", "pay bill", "bill payment", "settle", "confirm payment"]):
+            if 'payment' in intents:
                 return await self._handle_payment(user_id, message, document_data)
 
             # Default: general chat with optional document context
-            resp = await self.chat.respond_with_context(message, document_data=document_data)
+            resp = await self.chat.respond_with_context(message, document_data=document_data, cache_scope=user_id)
             # General LLM text, render as text
             resp['content_type'] = 'text'
             return resp
@@ -37,45 +87,38 @@ class AgentsOrchestrator:
 
     # ---------- HTML helpers ----------
     def _esc(self, v) -> str:
-        return html.escape("" if v is None else str(v), quote=True)
+        s = "" if v is None else str(v)
+        return s if _HTML_CHARS.search(s) is None else html.escape(s, quote=True)
 
     def _render_accounts_table(self, accounts: List[Dict[str, Any]]) -> str:
-        rows = []
-        for a in accounts:
-            acc_type = self._esc(a.get('account_type', ''))
-            acc_id = self._esc(a.get('account_id', ''))
-            curr = self._esc(a.get('currency', 'USD'))
-            bal = float(a.get('balance', 0.0))
-            bal_str = f"{curr} {bal:,.2f}"
-            bal_cls = "text-danger" if bal < 0 else "text-success"
-            rows.append(f"<tr><td>{acc_type}</td><td>{acc_id}</td><td class='{bal_cls}'>{self._esc(bal_str)}</td></tr>")
-        table = (
-            "<div class='table-responsive'>"
-            "<table class='table table-sm table-striped table-hover align-middle chat-table'>"
-            "<thead><tr><th>Account</th><th>Account ID</th><th>Balance</th></tr></thead>"
-            f"<tbody>{''.join(rows)}</tbody></table></div>"
+        return _ACCOUNTS_TABLE.format(rows="".join(self._account_row(a) for a in accounts))
+
+    def _account_row(self, a: Dict[str, Any]) -> str:
+        bal = float(a.get('balance', 0.0))
+        # Only the currency code can carry markup; the formatted number cannot
+        return _ACCOUNT_ROW.format(
+            self._esc(a.get('account_type', '')),
+            self._esc(a.get('account_id', '')),
+            "text-danger" if bal < 0 else "text-success",
+            f"{self._esc(a.get('currency', 'USD'))} {bal:,.2f}"
         )
-        return table
 
     def _render_transactions_table(self, account_id: str, txs: List[Dict[str, Any]]) -> str:
-        rows = []
-        for t in txs:
-            date = self._esc(t.get('date', ''))
-            merch = self._esc(t.get('merchant', ''))
-            desc = self._esc(t.get('description', ''))
-            amt = float(t.get('amount', 0.0))
-            amt_cls = "text-danger" if amt < 0 else "text-success"
-            sign = "-" if amt < 0 else "+"
-            amt_str = f"{sign}${abs(amt):,.2f}"
-            rows.append(f"<tr><td>{date}</td><td>{merch}</td><td>{desc}</td><td class='{amt_cls} text-end'>{self._esc(amt_str)}</td></tr>")
-        table = (
-            f"<div class='mb-2 small text-muted'>Recent transactions for account {self._esc(account_id)}:</div>"
-            "<div class='table-responsive'>"
-            "<table class='table table-sm table-striped table-hover align-middle chat-table'>"
-            "<thead><tr><th style='min-width: 140px;'>Date</th><th style='min-width: 160px;'>Merchant</th><th>Description</th><th class='text-end' style='min-width: 120px;'>Amount</th></tr></thead>"
-            f"<tbody>{''.join(rows)}</tbody></table></div>"
+        return _TX_TABLE.format(
+            account_id=self._esc(account_id),
+            rows="".join(self._tx_row(t) for t in txs)
+        )
+
+    def _tx_row(self, t: Dict[str, Any]) -> str:
+        amt = float(t.get('amount', 0.0))
+        sign = "-" if amt < 0 else "+"
+        return _TX_ROW.format(
+            self._esc(t.get('date', '')),
+            self._esc(t.get('merchant', '')),
+            self._esc(t.get('description', '')),
+            "text-danger" if amt < 0 else "text-success",
+            f"{sign}${abs(amt):,.2f}"  # digits/punctuation only, nothing to escape
         )
-        return table
 
     # ---------- Intents ----------
     async def _handle_balance(self, user_id: str, user_message: str) -> Dict[str, Any]:
@@ -96,7 +139,7 @@ class AgentsOrchestrator:
         accounts = self.data.get_accounts(user_id)
         if not accounts:
             return {'success': True, 'message': "No accounts found.", 'timestamp': datetime.utcnow().isoformat(), 'meta': {}, 'content_type': 'text'}
-        checking = next((a for a in accounts if str(a.get('account_type','')).lower() == 'checking'), accounts[0])
+        checking = _pick_checking_account(accounts)
         acct_id = checking.get('account_id')
         txs = self.data.get_recent_transactions(user_id, acct_id, limit=10)
         if not txs:
@@ -137,8 +180,7 @@ class AgentsOrchestrator:
                         continue
 
         if amount is None:
-            import re
-            m = re.search(r'(\$?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)', user_message)
+            m = _AMOUNT_RE.search(user_message)
             if m:
                 normalized = m.group(1).replace('$', '').replace(',', '')
                 try:
@@ -147,13 +189,8 @@ class AgentsOrchestrator:
                     amount = None
 
         if payee_name is None:
-            tokens = user_message.split()
-            if 'to' in [t.lower() for t in tokens]:
-                try:
-                    idx = [t.lower() for t in tokens].index('to')
-                    payee_name = " ".join(tokens[idx+1:]) if idx+1 < len(tokens) else None
-                except Exception:
-                    pass
+            m2 = _PAYEE_TO_RE.search(user_message)
+            payee_name = m2.group(1).strip() if m2 else None
 
         if not payee_name or not amount:
             msg = "To pay a bill, I need the payee name and the amount. You can upload the bill or tell me, e.g., 'Pay $125.50 to ACME Utilities'."
@@ -162,8 +199,8 @@ class AgentsOrchestrator:
         accounts = self.data.get_accounts(user_id)
         if not accounts:
             return {'success': True, 'message': "No accounts found to pay from.", 'timestamp': datetime.utcnow().isoformat(), 'meta': {'intent': 'payment'}, 'content_type': 'text'}
-        checking = next((a for a in accounts if str(a.get('account_type','')).lower() == 'checking'), accounts[0])
-        balance = float(checking.get('balance', 0.0))
+        checking = _pick_checking_account(accounts)
+        balance = checking['balance']
         if balance < amount:
             return {'success': True, 'message': f"Your balance (${balance:,.2f}) is insufficient to pay ${amount:,.2f}.", 'timestamp': datetime.utcnow().isoformat(), 'meta': {'intent': 'payment', 'can_pay': False}, 'content_type': 'text'}
 
@@ -1,11 +1,44 @@
 import logging
+import threading
+import time
 from azure.identity import ManagedIdentityCredential
 
 logger = logging.getLogger(__name__)
 
+# Refresh tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+class CachingTokenCredential:
+    """
+    Wraps a TokenCredential and reuses bearer tokens per scope until near expiry,
+    so Document Intelligence / Azure OpenAI calls don't each pay a token round-trip.
+    """
+    def __init__(self, credential):
+        self._credential = credential
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes, **kwargs):
+        key = (scopes, kwargs.get('tenant_id'), kwargs.get('claims'))
+        token = self._tokens.get(key)
+        if token and token.expires_on - TOKEN_REFRESH_MARGIN > time.time():
+            return token
+        with self._lock:
+            token = self._tokens.get(key)
+            if token and token.expires_on - TOKEN_REFRESH_MARGIN > time.time():
+                return token
+            token = self._credential.get_token(*scopes, **kwargs)
+            self._tokens[key] = token
+            return token
+
+    def close(self):
+        close = getattr(self._credential, 'close', None)
+        if close:
+            close()
+
 def get_managed_identity_credential():
-    cred = ManagedIdentityCredential()
+    cred = CachingTokenCredential(ManagedIdentityCredential())
     # Validate access by requesting a token for Azure Resource Manager scope
     _ = cred.get_token("https://management.azure.com/.default")
     logger.info("System-assigned Managed Identity token retrieval succeeded")
-    return cred
\ No newline at end of file
+    return cred
@@ -7,8 +7,28 @@ from typing import List, Dict, Any, Optional
 from azure.cosmos import CosmosClient, PartitionKey, exceptions
 from azure.identity import ManagedIdentityCredential
 
+from services.http_transport import get_azure_transport
+
 logger = logging.getLogger(__name__)
 
+# Serves "recent transactions for an account" as an index range read (no sort).
+# Only applied when the container is created.
+INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [{"path": "/\"_etag\"/?"}],
+    "compositeIndexes": [[
+        {"path": "/userId", "order": "ascending"},
+        {"path": "/type", "order": "ascending"},
+        {"path": "/accountId", "order": "ascending"},
+        {"path": "/date", "order": "descending"}
+    ]]
+}
+
+def account_doc_id(account_id: str) -> str:
+    """Cosmos item id for an account, so it can be fetched by point read."""
+    return f"account:{account_id}"
+
 class CosmosBankDataService:
     """
     Data layer for banking info using Cosmos DB (NoSQL).
@@ -22,12 +42,13 @@ class CosmosBankDataService:
         if not account_uri:
             raise ValueError("AZURE_COSMOSDB_ACCOUNT_URI not set")
 
-        # CosmosClient supports AAD via "credential"
-        self.client = CosmosClient(account_uri, credential=credential)
+        # CosmosClient supports AAD via "credential"; share the pooled HTTP transport
+        self.client = CosmosClient(account_uri, credential=credential, transport=get_azure_transport())
         self.db = self.client.create_database_if_not_exists(db_name)
         self.container = self.db.create_container_if_not_exists(
             id=container_name,
             partition_key=PartitionKey(path="/userId"),
+            indexing_policy=INDEXING_POLICY,
             offer_throughput=400
         )
         self.db_name = db_name
@@ -38,63 +59,85 @@ class CosmosBankDataService:
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         query = "SELECT * FROM c WHERE c.userId = @uid AND c.type = 'user'"
         params = [{"name": "@uid", "value": user_id}]
-        items = list(self.container.query_items(query=query, parameters=params, enable_cross_partition_query=True))
+        items = list(self.container.query_items(query=query, parameters=params, partition_key=user_id))
         return items[0] if items else None
 
     # Accounts
     def get_accounts(self, user_id: str) -> List[Dict[str, Any]]:
         query = "SELECT * FROM c WHERE c.userId = @uid AND c.type = 'account'"
         params = [{"name": "@uid", "value": user_id}]
-        return list(self.container.query_items(query=query, parameters=params, enable_cross_partition_query=True))
+        return list(self.container.query_items(query=query, parameters=params, partition_key=user_id))
 
     def get_account(self, user_id: str, account_id: str) -> Optional[Dict[str, Any]]:
+        # Point read by id + partition key (~1 RU) instead of a query
+        try:
+            return self.container.read_item(item=account_doc_id(account_id), partition_key=user_id)
+        except exceptions.CosmosResourceNotFoundError:
+            return self._query_account(user_id, account_id)
+
+    def _query_account(self, user_id: str, account_id: str) -> Optional[Dict[str, Any]]:
+        # Containers seeded before account ids became account:{accountId} (e.g. 'acc-checking')
+        # can't be point-read; find those accounts by query instead
         query = "SELECT * FROM c WHERE c.userId = @uid AND c.type = 'account' AND c.accountId = @aid"
         params = [{"name": "@uid", "value": user_id}, {"name": "@aid", "value": account_id}]
-        items = list(self.container.query_items(query=query, parameters=params, enable_cross_partition_query=True))
+        items = list(self.container.query_items(query=query, parameters=params, partition_key=user_id))
         return items[0] if items else None
 
     def update_account_balance(self, user_id: str, account_id: str, new_balance: float) -> bool:
-        acc = self.get_account(user_id, account_id)
-        if not acc:
-            return False
-        acc['balance'] = float(new_balance)
-        self.container.replace_item(item=acc, body=acc)
+        # Partial update by id + partition key: no read, only /balance goes over the wire
+        ops = [{"op": "set", "path": "/balance", "value": float(new_balance)}]
+        try:
+            self.container.patch_item(item=account_doc_id(account_id), partition_key=user_id, patch_operations=ops)
+        except exceptions.CosmosResourceNotFoundError:
+            legacy = self._query_account(user_id, account_id)
+            if not legacy:
+                return False
+            self.container.patch_item(item=legacy['id'], partition_key=user_id, patch_operations=ops)
         return True
 
     # Transactions
     def get_recent_transactions(self, user_id: str, account_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        query = ("SELECT TOP @lim * FROM c WHERE c.userId = @uid AND c.type = 'transaction' "
-                 "AND c.accountId = @aid ORDER BY c.date DESC")
+        # Project only the fields the UI renders
+        query = ("SELECT TOP @lim c.date, c.merchant, c.description, c.amount FROM c "
+                 "WHERE c.userId = @uid AND c.type = 'transaction' AND c.accountId = @aid "
+                 "ORDER BY c.date DESC")
         params = [{"name": "@uid", "value": user_id}, {"name": "@aid", "value": account_id}, {"name": "@lim", "value": limit}]
-        return list(self.container.query_items(query=query, parameters=params, enable_cross_partition_query=True))
+        return list(self.container.query_items(query=query, parameters=params, partition_key=user_id))
 
     def add_transaction(self, user_id: str, account_id: str, amount: float, description: str,
                         merchant: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
-        tx = {
-            'id': str(uuid.uuid4()),
+        tx = self._new_transaction(user_id, account_id, amount, description, merchant, category)
+        self.container.create_item(tx)
+        return tx
+
+    @staticmethod
+    def _new_transaction(user_id: str, account_id: str, amount: float, description: str,
+                         merchant: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+        # One random id serves as both the item id and the transactionId
+        tx_id = str(uuid.uuid4())
+        return {
+            'id': tx_id,
             'type': 'transaction',
             'userId': user_id,
             'accountId': account_id,
-            'transactionId': str(uuid.uuid4()),
+            'transactionId': tx_id,
             'date': datetime.now(timezone.utc).isoformat(),
             'amount': float(amount),
             'description': description,
             'merchant': merchant,
             'category': category or 'general'
         }
-        self.container.create_item(tx)
-        return tx
 
     # Payees and Bills
     def get_payees(self, user_id: str) -> List[Dict[str, Any]]:
         query = "SELECT * FROM c WHERE c.userId = @uid AND c.type = 'payee'"
         params = [{"name": "@uid", "value": user_id}]
-        return list(self.container.query_items(query=query, parameters=params, enable_cross_partition_query=True))
+        return list(self.container.query_items(query=query, parameters=params, partition_key=user_id))
 
     def find_payee_by_name(self, user_id: str, name: str) -> Optional[Dict[str, Any]]:
         query = "SELECT * FROM c WHERE c.userId = @uid AND c.type = 'payee' AND c.name = @name"
         params = [{"name": "@uid", "value": user_id}, {"name": "@name", "value": name}]
-        items = list(self.container.query_items(query=query, parameters=params, enable_cross_partition_query=True))
+        items = list(self.container.query_items(query=query, parameters=params, partition_key=user_id))
         return items[0] if items else None
 
     def create_payee(self, user_id: str, name: str, account_number: str, address: str = "") -> Dict[str, Any]:
@@ -125,15 +168,30 @@ class CosmosBankDataService:
         return item
 
     # Payment processing
-    def process_payment(self, user_id: str, from_account_id: str, payee_name: str, amount: float, memo: str = "Bill Payment") -> Dict[str, Any]:
-        account = self.get_account(user_id, from_account_id)
+    def process_payment(self, user_id: str, from_account_id: str, payee_name: str, amount: float, memo: str = "Bill Payment", *,
+                        account: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Callers that just read the account in the same turn can pass it to skip the lookup
+        if account is None:
+            account = self.get_account(user_id, from_account_id)
         if not account:
             return {'success': False, 'error': 'Account not found'}
-        balance = float(account.get('balance', 0.0))
-        if balance < amount:
+        if account['balance'] < amount:
             return {'success': False, 'error': 'Insufficient funds'}
-        # Deduct and add transaction
-        new_balance = balance - amount
-        self.update_account_balance(user_id, from_account_id, new_balance)
-        tx = self.add_transaction(user_id, from_account_id, -amount, memo, merchant=payee_name, category='bill-payment')
+        # Deduct and record the transaction atomically in one round-trip (same /userId partition).
+        # The balance check is re-evaluated server-side, so a stale `account` can't overdraw or
+        # overwrite a concurrent payment. Patch by the id that was read, so legacy account ids work too
+        tx = self._new_transaction(user_id, from_account_id, -amount, memo, merchant=payee_name, category='bill-payment')
+        batch = [
+            ("patch", (account['id'], [{"op": "incr", "path": "/balance", "value": -float(amount)}]),
+             {"filter_predicate": f"FROM c WHERE c.balance >= {float(amount)!r}"}),
+            ("create", (tx,)),
+        ]
+        try:
+            results = self.container.execute_item_batch(batch_operations=batch, partition_key=user_id)
+        except exceptions.CosmosBatchOperationError as e:
+            if e.error_index == 0 and e.operation_responses[0].get('statusCode') == 412:
+                return {'success': False, 'error': 'Insufficient funds'}
+            logger.error(f"Payment batch failed at operation {e.error_index}: {e}")
+            return {'success': False, 'error': 'Payment could not be completed'}
+        new_balance = results[0]['resourceBody']['balance']
         return {'success': True, 'new_balance': new_balance, 'transaction': tx}
\ No newline at end of file
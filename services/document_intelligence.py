@@ -1,24 +1,42 @@
 import os
 import logging
 import re
-from typing import Dict, List, Any
+from typing import IO, Dict, List, Any, Union
 from azure.ai.formrecognizer import DocumentAnalysisClient
 from azure.core.exceptions import AzureError
 
+from services.http_transport import get_azure_transport
+
 logger = logging.getLogger(__name__)
 
+# One pass over the OCR text each: plain 8-20 digit runs (covers the old 9-digit
+# pattern) or dashed/spaced groups
+_ACCT_PAT = re.compile(r'\b\d{8,20}\b|\b\d{4}[-\s]\d{4}[-\s]\d{4,8}\b')
+_AMOUNT_PAT = re.compile(r'(?:(?:USD|US\$|\$)\s?)?-?\b\d{1,3}(?:,\d{3})*(?:\.\d{2})?\b')
+_DATE_PAT = re.compile(
+    r'\b\d{4}-\d{2}-\d{2}\b'
+    r'|\b\d{2}/\d{2}/\d{4}\b'
+    r'|\b\d{2}-\d{2}-\d{4}\b'
+    r'|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}\b',
+    re.IGNORECASE
+)
+
 class DocumentIntelligenceService:
     def __init__(self, credential):
         endpoint = os.environ.get('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT')
         if not endpoint:
             raise ValueError("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT not set")
-        self.client = DocumentAnalysisClient(endpoint=endpoint, credential=credential)
+        self.client = DocumentAnalysisClient(endpoint=endpoint, credential=credential, transport=get_azure_transport())
         logger.info("DocumentAnalysisClient initialized")
 
     def analyze_document(self, file_path: str) -> Dict[str, Any]:
+        with open(file_path, "rb") as f:
+            return self.analyze_stream(f)
+
+    def analyze_stream(self, stream: Union[IO[bytes], bytes]) -> Dict[str, Any]:
+        """Analyze an in-memory upload (file-like object or bytes) without touching disk."""
         try:
-            with open(file_path, "rb") as f:
-                poller = self.client.begin_analyze_document("prebuilt-document", document=f)
+            poller = self.client.begin_analyze_document("prebuilt-document", document=stream)
             result = poller.result()
 
             key_values = []
@@ -32,11 +50,7 @@ class DocumentIntelligenceService:
                     key_values.append({'key': key, 'value': val, 'confidence': conf})
                     confidences.append(conf)
 
-            paragraphs = []
-            if getattr(result, 'paragraphs', None):
-                for p in result.paragraphs:
-                    paragraphs.append(p.content)
-            text_blob = "\n".join(paragraphs)
+            text_blob = "\n".join(p.content for p in result.paragraphs) if getattr(result, 'paragraphs', None) else ""
 
             banking_info = {
                 'account_numbers': self._extract_account_numbers(text_blob),
@@ -62,51 +76,54 @@ class DocumentIntelligenceService:
             raise
 
     def _extract_account_numbers(self, text: str) -> List[str]:
-        patterns = [r'\b\d{9}\b', r'\b\d{8,20}\b', r'\b[0-9]{4}[-\s][0-9]{4}[-\s][0-9]{4,8}\b']
-        found = set()
-        for pat in patterns:
-            for m in re.findall(pat, text):
-                found.add(m)
-        return list(found)[:10]
+        return list(set(_ACCT_PAT.findall(text)))[:10]
 
     def _extract_amounts(self, text: str) -> List[str]:
-        pat = r'(?:(?:USD|US\$|\$)\s?)?-?\b\d{1,3}(?:,\d{3})*(?:\.\d{2})?\b'
-        vals = re.findall(pat, text)
-        vals = [v.strip() for v in vals if '.' in v or ',' in v or '$' in v or 'USD' in v.upper()]
-        return list(dict.fromkeys(vals))[:10]
+        # Ordered dedup; stop scanning once 10 amounts are found. The pattern only
+        # matches upper-case "USD", so no case-folding is needed.
+        out = []
+        seen = set()
+        for m in _AMOUNT_PAT.finditer(text):
+            v = m.group()
+            if '.' in v or ',' in v or '$' in v or 'USD' in v:
+                v = v.strip()
+                if v not in seen:
+                    seen.add(v)
+                    out.append(v)
+                    if len(out) == 10:
+                        break
+        return out
 
     def _extract_dates(self, text: str) -> List[str]:
-        patterns = [
-            r'\b\d{4}-\d{2}-\d{2}\b',
-            r'\b\d{2}/\d{2}/\d{4}\b',
-            r'\b\d{2}-\d{2}-\d{4}\b',
-            r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}\b'
-        ]
-        found = set()
-        for pat in patterns:
-            for m in re.findall(pat, text, flags=re.IGNORECASE):
-                found.add(m)
-        return list(found)[:10]
+        return list(set(_DATE_PAT.findall(text)))[:10]
 
     def _extract_names(self, kv_pairs: List[Dict[str, Any]]) -> List[str]:
         names = []
+        seen = set()
         for kv in kv_pairs:
             k = (kv.get('key') or '').lower()
             if any(x in k for x in ['account name', 'name', 'account holder', 'payee']):
                 v = kv.get('value') or ''
-                if v and v not in names:
+                if v and v not in seen:
+                    seen.add(v)
                     names.append(v)
-        return names[:5]
+                    if len(names) == 5:
+                        break
+        return names
 
     def _extract_addresses(self, kv_pairs: List[Dict[str, Any]]) -> List[str]:
         addrs = []
+        seen = set()
         for kv in kv_pairs:
             k = (kv.get('key') or '').lower()
             if 'address' in k:
                 v = kv.get('value') or ''
-                if v and v not in addrs:
+                if v and v not in seen:
+                    seen.add(v)
                     addrs.append(v)
-        return addrs[:5]
+                    if len(addrs) == 5:
+                        break
+        return addrs
 
     def _extract_tables(self, result) -> List[Dict[str, Any]]:
         tables_out = []
@@ -0,0 +1,38 @@
+"""
+Shared HTTP connection pool for Azure SDK clients.
+
+A single requests.Session is reused by every azure-core based client so TLS
+sessions and keep-alive connections are shared instead of re-established per
+client/call.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+
+POOL_SIZE = 32
+
+_session = None
+_lock = threading.Lock()
+
+def get_shared_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_SIZE,
+                    pool_maxsize=POOL_SIZE,
+                    # azure-core's RetryPolicy retries each call; retrying here too would
+                    # multiply attempts and backoff
+                    max_retries=0
+                )
+                s.mount('https://', adapter)
+                _session = s
+    return _session
+
+def get_azure_transport() -> RequestsTransport:
+    # session_owner=False: the pooled session outlives any single client
+    return RequestsTransport(session=get_shared_session(), session_owner=False)
@@ -0,0 +1,51 @@
+"""
+Long-lived asyncio event loops driven from synchronous code.
+
+Under eventlet, threading.Thread is monkey-patched into a greenthread, and an
+asyncio loop started there collides with the hub ("Cannot run the event loop
+while another loop is running"). Loops therefore run on real OS threads, and
+callers wait for results through eventlet's tpool so the hub keeps serving
+other greenthreads meanwhile.
+"""
+import asyncio
+import queue
+import threading
+
+try:
+    from eventlet import patcher, tpool
+    _EVENTLET = patcher.is_monkey_patched('thread')
+except ImportError:
+    _EVENTLET = False
+
+if _EVENTLET:
+    _threading = patcher.original('threading')
+    _queue = patcher.original('queue')
+else:
+    _threading = threading
+    _queue = queue
+
+def start_loop_thread(name: str):
+    """Start an event loop on a daemon OS thread; returns (loop, thread)."""
+    loop = asyncio.new_event_loop()
+    thread = _threading.Thread(target=loop.run_forever, name=name, daemon=True)
+    thread.start()
+    return loop, thread
+
+def run_in_loop(loop: asyncio.AbstractEventLoop, coro, timeout: float):
+    """Run coro on loop and wait up to timeout seconds; on timeout it is cancelled and TimeoutError raised."""
+    fut = asyncio.run_coroutine_threadsafe(coro, loop)
+    if not _EVENTLET:
+        try:
+            return fut.result(timeout=timeout)
+        except TimeoutError:
+            fut.cancel()
+            raise
+    # Wait on a real lock in a tpool thread, not a green one signalled across OS threads
+    done = _queue.Queue(maxsize=1)
+    fut.add_done_callback(done.put)
+    try:
+        tpool.execute(done.get, True, timeout)
+    except _queue.Empty:
+        fut.cancel()
+        raise TimeoutError(f"coroutine did not finish within {timeout}s")
+    return fut.result()
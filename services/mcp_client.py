@@ -5,13 +5,16 @@ If MCP is unavailable, importing this module will raise, and the app will
 fallback to direct SQLite data service.
 """
 import asyncio
-import json
 import os
 import sys
 from typing import Any, Dict, List, Optional
 
 from pathlib import Path
 
+import orjson
+
+from services.loop_thread import start_loop_thread, run_in_loop
+
 # MCP client IO over stdio
 try:
     from mcp.client.session import ClientSession
@@ -22,6 +25,26 @@ except Exception as e:
 ROOT = Path(__file__).resolve().parents[1]
 SERVER_PATH = ROOT / "services" / "sqlite_mcp_server.py"
 
+# Seconds to wait for a tool call, and for spawning the server + MCP handshake
+CALL_TIMEOUT = 30
+STARTUP_TIMEOUT = 15
+
+def _decode_result(result: Any) -> Any:
+    """
+    Tools return JSON-serializable values, which arrive as JSON text content;
+    decode them with orjson. A tool error raises RuntimeError with its message,
+    empty content (a tool returning None) decodes to None, and several text
+    items decode to a list.
+    """
+    content = getattr(result, 'content', None) or []
+    texts = [t for t in (getattr(c, 'text', None) for c in content) if t is not None]
+    if getattr(result, 'isError', False):
+        raise RuntimeError("MCP tool error: " + ("\n".join(texts) or "unknown error"))
+    if not texts:
+        return None
+    values = [orjson.loads(t) for t in texts]
+    return values[0] if len(values) == 1 else values
+
 class MCPBankDataService:
     def __init__(self, db_path: str):
         self.db_path = db_path
@@ -30,10 +53,20 @@ class MCPBankDataService:
         # Ensure env var for server
         env = os.environ.copy()
         env['SQLITE_DB_PATH'] = db_path
-        # Spawn server subprocess
-        self._proc = asyncio.get_event_loop().run_until_complete(self._start_server(env))
-        # Create client session
-        self._session = asyncio.get_event_loop().run_until_complete(self._start_session())
+        # One event loop for the client's lifetime, owned by a background thread;
+        # sync methods submit coroutines to it (safe to call from async frameworks too)
+        self._loop, self._thread = start_loop_thread("mcp-client-loop")
+        try:
+            # Spawn server subprocess
+            self._proc = self._run(self._start_server(env), STARTUP_TIMEOUT)
+            # Create client session
+            self._session = self._run(self._start_session(), STARTUP_TIMEOUT)
+        except Exception:
+            self.close()
+            raise
+
+    def _run(self, coro, timeout: float = CALL_TIMEOUT):
+        return run_in_loop(self._loop, coro, timeout)
 
     async def _start_server(self, env):
         # Launch MCP server as subprocess
@@ -56,50 +89,74 @@ class MCPBankDataService:
         if not self._session:
             raise RuntimeError("MCP session not initialized")
         result = await self._session.call_tool(tool_name, arguments)
-        # Tools return JSON-serializable values
-        return result
+        return _decode_result(result)
 
     # Public methods mirror SqliteBankDataService
 
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
-        return asyncio.get_event_loop().run_until_complete(self._call("get_user", {"user_id": user_id}))
+        return self._run(self._call("get_user", {"user_id": user_id}))
 
     def get_accounts(self, user_id: str) -> List[Dict[str, Any]]:
-        return asyncio.get_event_loop().run_until_complete(self._call("get_accounts", {"user_id": user_id}))
+        return self._run(self._call("get_accounts", {"user_id": user_id}))
 
     def get_account(self, user_id: str, account_id: str) -> Optional[Dict[str, Any]]:
-        return asyncio.get_event_loop().run_until_complete(self._call("get_account", {"user_id": user_id, "account_id": account_id}))
+        return self._run(self._call("get_account", {"user_id": user_id, "account_id": account_id}))
 
     def update_account_balance(self, user_id: str, account_id: str, new_balance: float) -> bool:
         # Not exposed as a separate tool; emulate via process_payment of negative amount? Keep it simple: not supported via MCP.
         raise NotImplementedError("Direct balance update not exposed via MCP")
 
     def get_recent_transactions(self, user_id: str, account_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        return asyncio.get_event_loop().run_until_complete(self._call("get_recent_transactions", {"user_id": user_id, "account_id": account_id, "limit": int(limit)}))
+        return self._run(self._call("get_recent_transactions", {"user_id": user_id, "account_id": account_id, "limit": int(limit)}))
 
     def add_transaction(self, user_id: str, account_id: str, amount: float, description: str,
                         merchant: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
-        return asyncio.get_event_loop().run_until_complete(self._call("add_transaction", {
+        return self._run(self._call("add_transaction", {
             "user_id": user_id, "account_id": account_id, "amount": float(amount),
             "description": description, "merchant": merchant, "category": category
         }))
 
     def find_payee_by_name(self, user_id: str, name: str) -> Optional[Dict[str, Any]]:
-        return asyncio.get_event_loop().run_until_complete(self._call("find_payee_by_name", {"user_id": user_id, "name": name}))
+        return self._run(self._call("find_payee_by_name", {"user_id": user_id, "name": name}))
 
     def process_payment(self, user_id: str, from_account_id: str, payee_name: str, amount: float, memo: str = "Bill Payment") -> Dict[str, Any]:
-        return asyncio.get_event_loop().run_until_complete(self._call("process_payment", {
+        return self._run(self._call("process_payment", {
             "user_id": user_id, "from_account_id": from_account_id, "payee_name": payee_name, "amount": float(amount), "memo": memo
         }))
 
+    def close(self, timeout: float = 2.0) -> None:
+        """Close the session, stop the server process and shut down the loop thread."""
+        loop = getattr(self, '_loop', None)
+        if loop is None or loop.is_closed():
+            return
+        if loop.is_running():
+            try:
+                if self._session:
+                    self._run(self._session.close(), timeout)
+            except Exception:
+                pass
+            self._session = None
+            try:
+                if self._proc and self._proc.returncode is None:
+                    # asyncio subprocesses are reaped by their loop, so wait before stopping it
+                    self._run(self._stop_server(timeout), timeout * 2)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=timeout)
+        if not loop.is_running():
+            loop.close()
+
+    async def _stop_server(self, timeout: float) -> None:
+        self._proc.terminate()
+        try:
+            await asyncio.wait_for(self._proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._proc.kill()
+            await self._proc.wait()
+
     def __del__(self):
         try:
-            if self._session:
-                asyncio.get_event_loop().run_until_complete(self._session.close())
+            self.close()
         except Exception:
             pass
-        try:
-            if self._proc:
-                self._proc.kill()
-        except Exception:
-            pass
\ No newline at end of file
@@ -1,13 +1,47 @@
 import os
+import asyncio
+import atexit
+import hashlib
 import logging
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from itertools import islice
 from typing import List, Dict, Any, Optional
-from openai import AzureOpenAI
+import httpx
+import orjson
+from openai import AzureOpenAI, AsyncAzureOpenAI
+
+from services.semantic_cache import SemanticCache, context_hash
 
 logger = logging.getLogger(__name__)
 
 COGNITIVE_SCOPE = "https://cognitiveservices.azure.com/.default"
 
+# Classifies recoverable 400s from the chat API in one scan:
+# p = parameter the model rejects, top_p = loose "top_p not supported" wording, temp = temperature must be 1
+_ERR_RE = re.compile(
+    r"Unsupported parameter: '(?P<p>max_tokens|max_completion_tokens|top_p)'"
+    r"|(?P<top_p>\btop_p\b.*?not supported|not supported.*?\btop_p\b)"
+    r"|(?P<temp>temperature).*?(?:must be 1|only supports|supported values)",
+    re.IGNORECASE | re.DOTALL
+)
+
+# System prompts memoized per document
+_PROMPT_CACHE_MAX = 32
+
+# Concurrent completions in summarize_many
+SUMMARIZE_CONCURRENCY = 16
+
+# Document summaries should be reproducible, so they run at temperature 0; that also
+# makes them cacheable (re-summarizing the same document is then served from the cache)
+SUMMARY_TEMPERATURE = 0.0
+
+# Exact-match response cache size (only deterministic, temperature=0 calls are cached;
+# models that force temperature=1 never hit it)
+_CACHE_MAX = 512
+
 class OpenAIChatService:
     """
     Azure OpenAI chat wrapper with:
@@ -20,6 +54,8 @@ class OpenAIChatService:
         self.deployment_name = os.environ.get('AZURE_OPENAI_CHAT_DEPLOYMENT')
         self.max_tokens_default = int(os.environ.get('AZURE_OPENAI_MAX_TOKENS', '1500'))
         self.temperature = float(os.environ.get('AZURE_OPENAI_TEMPERATURE', '0.7'))
+        # Optional embeddings deployment; enables the semantic answer cache
+        self.embedding_deployment = os.environ.get('AZURE_OPENAI_EMBEDDING_DEPLOYMENT')
 
         if not self.endpoint or not self.deployment_name:
             raise ValueError("Azure OpenAI endpoint and deployment must be configured")
@@ -32,42 +68,99 @@ class OpenAIChatService:
         # Token parameter selector (auto-switches based on 400 error hints)
         self._use_max_completion_tokens = False
 
+        # LRU of completion responses keyed by request hash
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # System prompts per document_data (see get_system_prompt)
+        self._prompt_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._prompt_lock = threading.Lock()
+
         def token_provider():
             token = credential.get_token(COGNITIVE_SCOPE).token
             return token
 
+        # Pooled keep-alive connections, reused across calls (no TLS handshake per request)
+        self._http = httpx.Client(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
         self.client = AzureOpenAI(
             azure_endpoint=self.endpoint,
             api_version=self.api_version,
             azure_ad_token_provider=token_provider,
-            timeout=30.0,
+            http_client=self._http,
             max_retries=2
         )
+        # Async client for the chat path so concurrent turns overlap on the orchestrator loop
+        self._ahttp = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+        self.aclient = AsyncAzureOpenAI(
+            azure_endpoint=self.endpoint,
+            api_version=self.api_version,
+            azure_ad_token_provider=token_provider,
+            http_client=self._ahttp,
+            max_retries=2
+        )
+        atexit.register(self.close)
+        self._semantic_cache = SemanticCache() if self.embedding_deployment else None
         logger.info("Azure OpenAI client initialized")
 
+    def close(self):
+        # Sync pool only; the async pool must be closed on its loop via aclose()
+        self._http.close()
+
+    async def aclose(self):
+        """Close both pools; run on the loop that used the async client (app.run_orchestrator)."""
+        await self.aclient.close()
+        self._http.close()
+
     def get_system_prompt(self, document_data: Optional[Dict] = None) -> str:
         base = "You are a professional banking assistant. Be precise, clear, and privacy-conscious.\n"
-        if document_data:
-            banking = document_data.get('banking_info', {})
-            kv = document_data.get('key_value_pairs', [])
-            conf = document_data.get('confidence_scores', {})
-            kv_sample = "; ".join([f"{(i.get('key') or '')}: {(i.get('value') or '')}" for i in kv[:5]])
-            base += (
-                "Document context available.\n"
-                f"- Accounts: {banking.get('account_numbers', [])}\n"
-                f"- Amounts: {banking.get('amounts', [])}\n"
-                f"- Dates: {banking.get('dates', [])}\n"
-                f"- Names: {banking.get('names', [])}\n"
-                f"- Avg Confidence: {conf.get('average', 0):.1%}\n"
-                f"- Key-Values (sample): {kv_sample}\n"
-            )
-        return base
+        if not document_data:
+            return base
+        banking = document_data.get('banking_info', {})
+        kv = document_data.get('key_value_pairs', [])
+        conf = document_data.get('confidence_scores', {})
+        kv_head = list(islice(kv, 5))
+        # Memoized on a hash of the fields the prompt uses, so a document re-read from the
+        # session store (a new dict every request) still hits
+        key = hashlib.sha256(orjson.dumps([banking, kv_head, conf.get('average', 0)],
+                                          option=orjson.OPT_SORT_KEYS)).hexdigest()
+        with self._prompt_lock:
+            prompt = self._prompt_cache.get(key)
+            if prompt is not None:
+                self._prompt_cache.move_to_end(key)
+                return prompt
+        kv_sample = "; ".join(f"{(i.get('key') or '')}: {(i.get('value') or '')}" for i in kv_head)
+        prompt = base + (
+            "Document context available.\n"
+            f"- Accounts: {banking.get('account_numbers', [])}\n"
+            f"- Amounts: {banking.get('amounts', [])}\n"
+            f"- Dates: {banking.get('dates', [])}\n"
+            f"- Names: {banking.get('names', [])}\n"
+            f"- Avg Confidence: {conf.get('average', 0):.1%}\n"
+            f"- Key-Values (sample): {kv_sample}\n"
+        )
+        with self._prompt_lock:
+            self._prompt_cache[key] = prompt
+            if len(self._prompt_cache) > _PROMPT_CACHE_MAX:
+                self._prompt_cache.popitem(last=False)
+        return prompt
+
+    def clear_prompt_cache(self) -> None:
+        """Drop memoized system prompts (e.g. after a document dict was mutated in place)."""
+        with self._prompt_lock:
+            self._prompt_cache.clear()
 
     def _create_chat_completion(
         self,
         messages: List[Dict[str, str]],
         max_tokens: Optional[int] = None,
-        temperature: Optional[float] = None
+        temperature: Optional[float] = None,
+        use_cache: bool = True
     ):
         """
         Calls chat.completions.create with model-specific constraints:
@@ -75,77 +168,137 @@ class OpenAIChatService:
         - Omits top_p if the model doesn't support it (e.g., gpt-5-mini)
         - Forces temperature=1 if the model requires it (e.g., gpt-5-mini)
         - Retries once when a 400 error indicates an unsupported parameter
+        - Serves repeated temperature=0 requests from an in-process LRU cache
+        Blocking; used by the sync callers (summarize, test_connection).
         """
+        max_tokens, eff_temperature = self._resolve_params(max_tokens, temperature)
+        cache_key = self._cache_key(messages, max_tokens, eff_temperature) if use_cache and eff_temperature == 0 else None
+        if cache_key is not None:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+        state = self._initial_state(eff_temperature)
+        for _ in range(2):
+            try:
+                resp = self.client.chat.completions.create(**self._build_kwargs(messages, max_tokens, *state))
+                break
+            except Exception as e:
+                state = self._adjust_for_error(e, state)
+        else:
+            # Final attempt with last known-good settings
+            resp = self.client.chat.completions.create(**self._build_kwargs(messages, max_tokens, *state))
+
+        if cache_key is not None:
+            self._cache_put(cache_key, resp)
+        return resp
+
+    async def _acreate_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        use_cache: bool = True
+    ):
+        """Async twin of _create_chat_completion on AsyncAzureOpenAI; same constraints and cache."""
+        max_tokens, eff_temperature = self._resolve_params(max_tokens, temperature)
+        cache_key = self._cache_key(messages, max_tokens, eff_temperature) if use_cache and eff_temperature == 0 else None
+        if cache_key is not None:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+        state = self._initial_state(eff_temperature)
+        for _ in range(2):
+            try:
+                resp = await self.aclient.chat.completions.create(**self._build_kwargs(messages, max_tokens, *state))
+                break
+            except Exception as e:
+                state = self._adjust_for_error(e, state)
+        else:
+            resp = await self.aclient.chat.completions.create(**self._build_kwargs(messages, max_tokens, *state))
+
+        if cache_key is not None:
+            self._cache_put(cache_key, resp)
+        return resp
+
+    def _resolve_params(self, max_tokens: Optional[int], temperature: Optional[float]):
         if max_tokens is None:
             max_tokens = self.max_tokens_default
-
         # Apply temperature constraints
         eff_temperature = 1.0 if self._force_temperature_one else (self.temperature if temperature is None else temperature)
+        return max_tokens, eff_temperature
 
-        def do_call(use_completion_param: bool, include_top_p: bool, temp: Optional[float]):
-            kwargs = {
-                "model": self.deployment_name,
-                "messages": messages,
-            }
-            # Token param
-            if use_completion_param:
-                kwargs["max_completion_tokens"] = max_tokens
-            else:
-                kwargs["max_tokens"] = max_tokens
+    def _initial_state(self, eff_temperature: float):
+        # (use_completion_param, include_top_p, temperature)
+        return (self._use_max_completion_tokens, self._supports_top_p, eff_temperature)
 
-            # Temperature
-            if temp is not None:
-                kwargs["temperature"] = float(temp)
+    def _build_kwargs(self, messages: List[Dict[str, str]], max_tokens: int,
+                      use_completion_param: bool, include_top_p: bool, temp: Optional[float]) -> Dict[str, Any]:
+        kwargs = {
+            "model": self.deployment_name,
+            "messages": messages,
+        }
+        # Token param
+        if use_completion_param:
+            kwargs["max_completion_tokens"] = max_tokens
+        else:
+            kwargs["max_tokens"] = max_tokens
 
-            # top_p only if supported
-            if include_top_p:
-                kwargs["top_p"] = 0.95
+        # Temperature
+        if temp is not None:
+            kwargs["temperature"] = float(temp)
 
-            return self.client.chat.completions.create(**kwargs)
+        # top_p only if supported
+        if include_top_p:
+            kwargs["top_p"] = 0.95
+        return kwargs
 
-        attempts = 0
-        use_completion_param = self._use_max_completion_tokens
-        include_top_p = self._supports_top_p
-        temp_val = eff_temperature
+    def _adjust_for_error(self, e: Exception, state):
+        """New (use_completion_param, include_top_p, temperature) for a recoverable 400; re-raises otherwise."""
+        use_completion_param, include_top_p, temp_val = state
+        m = _ERR_RE.search(str(e))
+        if m is None:
+            raise e
+        param = m.group('p')
+        # Flip token parameter if needed
+        if param == 'max_tokens':
+            self._use_max_completion_tokens = True
+            return (True, include_top_p, temp_val)
+        if param == 'max_completion_tokens':
+            self._use_max_completion_tokens = False
+            return (False, include_top_p, temp_val)
+        # Remove top_p if not supported
+        if param == 'top_p' or m.group('top_p'):
+            self._supports_top_p = False
+            return (use_completion_param, False, temp_val)
+        # Force temperature=1 if required
+        self._force_temperature_one = True
+        return (use_completion_param, include_top_p, 1.0)
 
-        while attempts < 2:
-            try:
-                return do_call(use_completion_param, include_top_p, temp_val)
-            except Exception as e:
-                msg = str(e)
-                # Flip token parameter if needed
-                if "Unsupported parameter: 'max_tokens'" in msg and "max_completion_tokens" in msg:
-                    use_completion_param = True
-                    self._use_max_completion_tokens = True
-                    attempts += 1
-                    continue
-                if "Unsupported parameter: 'max_completion_tokens'" in msg and "max_tokens" in msg:
-                    use_completion_param = False
-                    self._use_max_completion_tokens = False
-                    attempts += 1
-                    continue
-                # Remove top_p if not supported
-                if ("Unsupported parameter" in msg or "not supported" in msg) and "top_p" in msg:
-                    include_top_p = False
-                    self._supports_top_p = False
-                    attempts += 1
-                    continue
-                # Force temperature=1 if required
-                low = msg.lower()
-                if "temperature" in low and ("must be 1" in low or "only supports" in low or "supported values" in low):
-                    temp_val = 1.0
-                    self._force_temperature_one = True
-                    attempts += 1
-                    continue
-                # Unknown error, re-raise
-                raise
-
-        # Final attempt with last known-good settings
-        return do_call(use_completion_param, include_top_p, temp_val)
+    def _cache_key(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        payload = orjson.dumps(
+            {"m": self.deployment_name, "msgs": messages, "mt": max_tokens, "t": temperature, "p": self._supports_top_p},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.sha256(payload).hexdigest()
+
+    def _cache_get(self, key: str):
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+            return cached
+
+    def _cache_put(self, key: str, resp) -> None:
+        with self._cache_lock:
+            self._cache[key] = resp
+            if len(self._cache) > _CACHE_MAX:
+                self._cache.popitem(last=False)
 
     async def chat(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         try:
-            resp = self._create_chat_completion(messages=messages)
+            resp = await self._acreate_chat_completion(messages=messages)
             content = resp.choices[0].message.content
             tokens = getattr(resp, 'usage', None).total_tokens if getattr(resp, 'usage', None) else 0
             return {
@@ -157,24 +310,67 @@ class OpenAIChatService:
         except Exception as e:
             return {'success': False, 'error': str(e), 'timestamp': datetime.utcnow().isoformat()}
 
-    async def respond_with_context(self, user_message: str, document_data: Optional[Dict] = None, history: Optional[List[Dict]] = None) -> Dict[str, Any]:
-        messages = [{"role": "system", "content": self.get_system_prompt(document_data)}]
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        try:
+            resp = await self.aclient.embeddings.create(model=self.embedding_deployment, input=text)
+            return resp.data[0].embedding
+        except Exception as e:
+            logger.warning(f"Embedding failed, skipping semantic cache: {e}")
+            return None
+
+    async def respond_with_context(self, user_message: str, document_data: Optional[Dict] = None, history: Optional[List[Dict]] = None,
+                                   cache_scope: Optional[str] = None) -> Dict[str, Any]:
+        """
+        cache_scope (e.g. the user id) partitions the semantic cache. Only context-free
+        turns (no document, no history) are cached: the system prompt holds just a sample
+        of the document, so it can't tell two users' documents apart.
+        """
+        system_prompt = self.get_system_prompt(document_data)
+        embedding = ctx = None
+        if self._semantic_cache is not None and cache_scope is not None and not document_data and not history:
+            embedding = await self._embed(user_message)
+            if embedding is not None:
+                ctx = context_hash(cache_scope, system_prompt)
+                hit = self._semantic_cache.lookup(embedding, ctx)
+                if hit is not None:
+                    return {**hit, 'timestamp': datetime.utcnow().isoformat()}
+
+        messages = [{"role": "system", "content": system_prompt}]
         if history:
             messages.extend(history[-10:])
         messages.append({"role": "user", "content": user_message})
-        return await self.chat(messages)
+        result = await self.chat(messages)
+        if embedding is not None and result.get('success'):
+            self._semantic_cache.insert(embedding, ctx, result)
+        return result
+
+    def _summary_messages(self, document_data: Dict) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.get_system_prompt(document_data)},
+            {"role": "user", "content": "Summarize the key points of this banking document in a short paragraph."}
+        ]
 
     def summarize(self, document_data: Dict) -> Dict[str, Any]:
         try:
-            messages = [
-                {"role": "system", "content": self.get_system_prompt(document_data)},
-                {"role": "user", "content": "Summarize the key points of this banking document in a short paragraph."}
-            ]
-            resp = self._create_chat_completion(messages=messages, max_tokens=300, temperature=0.3)
+            resp = self._create_chat_completion(messages=self._summary_messages(document_data), max_tokens=300, temperature=SUMMARY_TEMPERATURE)
             return {'success': True, 'summary': resp.choices[0].message.content, 'timestamp': datetime.utcnow().isoformat()}
         except Exception as e:
             return {'success': False, 'error': str(e), 'timestamp': datetime.utcnow().isoformat()}
 
+    async def summarize_many(self, docs: List[Dict]) -> List[Dict[str, Any]]:
+        """Summarize several documents concurrently; results are in input order, same shape as summarize()."""
+        sem = asyncio.Semaphore(SUMMARIZE_CONCURRENCY)
+
+        async def one(document_data: Dict) -> Dict[str, Any]:
+            try:
+                async with sem:
+                    resp = await self._acreate_chat_completion(messages=self._summary_messages(document_data), max_tokens=300, temperature=SUMMARY_TEMPERATURE)
+                return {'success': True, 'summary': resp.choices[0].message.content, 'timestamp': datetime.utcnow().isoformat()}
+            except Exception as e:
+                return {'success': False, 'error': str(e), 'timestamp': datetime.utcnow().isoformat()}
+
+        return await asyncio.gather(*(one(d) for d in docs))
+
     def test_connection(self) -> Dict[str, Any]:
         try:
             resp = self._create_chat_completion(
@@ -183,7 +379,8 @@ class OpenAIChatService:
                     {"role": "user", "content": "Say OK."}
                 ],
                 max_tokens=5,
-                temperature=0.0
+                temperature=0.0,
+                use_cache=False  # health probe must reach the service
             )
             return {'success': True, 'response': resp.choices[0].message.content}
         except Exception as e:
@@ -0,0 +1,72 @@
+"""
+Embedding-similarity cache for chat answers.
+
+Paraphrased questions ("capital of France" / "France's capital") map to nearby
+embeddings; a hit returns the earlier answer instead of another LLM call.
+Entries are keyed by a context hash (system prompt + last history turn) so a
+question is only matched against answers given in the same conversational
+context.
+"""
+import hashlib
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+
+SIMILARITY_THRESHOLD = 0.92
+MAX_ENTRIES = 1024
+
+def context_hash(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(repr(p).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+class SemanticCache:
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_entries: int = MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._embeddings: Optional[np.ndarray] = None  # [N, D] float32, L2-normalized rows
+        self._entries: List[tuple] = []  # parallel (response, ctx_hash)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vec) -> Optional[np.ndarray]:
+        q = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        return q / norm if norm else None
+
+    def lookup(self, embedding, ctx_hash: str) -> Optional[Any]:
+        q = self._normalize(embedding)
+        if q is None:
+            return None
+        with self._lock:
+            if self._embeddings is None or self._embeddings.shape[1] != q.shape[0]:
+                return None
+            sims = self._embeddings @ q
+            # Only answers from the same context are eligible
+            for i in np.argsort(sims)[::-1]:
+                if sims[i] <= self.threshold:
+                    return None
+                response, h = self._entries[i]
+                if h == ctx_hash:
+                    return response
+        return None
+
+    def insert(self, embedding, ctx_hash: str, response: Any) -> None:
+        q = self._normalize(embedding)
+        if q is None:
+            return
+        with self._lock:
+            if self._embeddings is None or self._embeddings.shape[1] != q.shape[0]:
+                self._embeddings = q[None, :]
+                self._entries = [(response, ctx_hash)]
+                return
+            self._embeddings = np.vstack((self._embeddings, q))
+            self._entries.append((response, ctx_hash))
+            if len(self._entries) > self.max_entries:
+                # Drop the oldest entries
+                drop = len(self._entries) - self.max_entries
+                self._embeddings = self._embeddings[drop:]
+                self._entries = self._entries[drop:]
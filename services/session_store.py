@@ -0,0 +1,139 @@
+"""
+Chat session storage.
+
+Sessions are kept in Redis (one hash per session id, expiring after
+CHAT_SESSION_TIMEOUT seconds of inactivity) so multiple workers/containers
+share state. When Redis is not configured, an in-process dict is used
+(single worker only).
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "sess:"
+_JSON_FIELDS = ('messages', 'documents', 'last_assistant_meta')
+_DATETIME_FIELDS = ('created_at', 'last_activity')
+
+_redis_client = None
+
+def get_redis_client(redis_url: str):
+    """Process-wide Redis client backed by a blocking connection pool."""
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        pool = redis.BlockingConnectionPool.from_url(redis_url, max_connections=64)
+        _redis_client = redis.Redis(connection_pool=pool)
+    return _redis_client
+
+def _encode(chat_session: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    out = {}
+    items = chat_session.items() if fields is None else ((k, chat_session.get(k)) for k in fields)
+    for k, v in items:
+        if k in _JSON_FIELDS:
+            out[k] = json.dumps(list(v) if isinstance(v, deque) else v)
+        elif k in _DATETIME_FIELDS and isinstance(v, datetime):
+            out[k] = v.isoformat()
+        else:
+            out[k] = "" if v is None else str(v)
+    return out
+
+def _decode(raw: Dict[bytes, bytes], max_history: int) -> Dict[str, Any]:
+    cs = {}
+    for k, v in raw.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        v = v.decode() if isinstance(v, bytes) else v
+        if k == 'documents':
+            # doc_id -> entry; JSON objects keep insertion order
+            cs[k] = OrderedDict(json.loads(v)) if v else OrderedDict()
+        elif k == 'messages':
+            cs[k] = deque(json.loads(v) if v else [], maxlen=max_history)
+        elif k in _JSON_FIELDS:
+            cs[k] = json.loads(v) if v else None
+        elif k in _DATETIME_FIELDS:
+            cs[k] = datetime.fromisoformat(v) if v else None
+        else:
+            cs[k] = v or None
+    return cs
+
+class InMemoryChatSessionStore:
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self._sessions.get(session_id)
+
+    def save(self, session_id: str, chat_session: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> None:
+        # Callers share the stored dict, so a partial save is already applied
+        self._sessions[session_id] = chat_session
+
+    def update(self, session_id: str, mutate: Callable[[Dict[str, Any]], Any],
+               fields: Optional[Iterable[str]] = None) -> Any:
+        with self._lock:
+            cs = self._sessions.get(session_id)
+            return mutate(cs) if cs is not None else None
+
+class RedisChatSessionStore:
+    def __init__(self, client, ttl_seconds: int, max_history: int):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+
+    def _key(self, session_id: str) -> str:
+        return f"{_KEY_PREFIX}{session_id}"
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._key(session_id))
+        return _decode(raw, self.max_history) if raw else None
+
+    def save(self, session_id: str, chat_session: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> None:
+        """Write the session, or only `fields` of it, so other fields aren't overwritten with a stale copy."""
+        key = self._key(session_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping=_encode(chat_session, fields))
+        pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def update(self, session_id: str, mutate: Callable[[Dict[str, Any]], Any],
+               fields: Optional[Iterable[str]] = None) -> Any:
+        """
+        Read-modify-write under WATCH/MULTI: mutate(cs) runs on a fresh copy and is retried
+        if the session changed before the write. Returns mutate's result (None if the
+        session no longer exists).
+        """
+        import redis
+        key = self._key(session_id)
+        with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.hgetall(key)
+                    if not raw:
+                        pipe.unwatch()
+                        return None
+                    cs = _decode(raw, self.max_history)
+                    result = mutate(cs)
+                    pipe.multi()
+                    pipe.hset(key, mapping=_encode(cs, fields))
+                    pipe.expire(key, self.ttl_seconds)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+def create_chat_session_store(redis_url: Optional[str], ttl_seconds: int, max_history: int):
+    if redis_url:
+        try:
+            client = get_redis_client(redis_url)
+            client.ping()
+            logger.info("Using Redis chat session store.")
+            return RedisChatSessionStore(client, ttl_seconds, max_history)
+        except Exception as e:
+            logger.warning(f"Redis unavailable, falling back to in-memory sessions: {e}")
+    logger.info("Using in-memory chat session store.")
+    return InMemoryChatSessionStore()
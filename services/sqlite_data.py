@@ -1,13 +1,41 @@
+import contextlib
+import logging
+import queue
+import random
 import sqlite3
+import threading
 import time
-from typing import List, Dict, Any, Optional
+import uuid
+import weakref
+from typing import Iterator, List, Dict, Any, Optional
 from datetime import datetime, timezone
 
-def _dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
+logger = logging.getLogger(__name__)
+
+# SQL used on every call, kept as constants so the per-connection statement cache
+# (cached_statements) hits on the same text
+SQL_GET_USER = "SELECT * FROM users WHERE id=?"
+SQL_GET_ACCOUNTS = "SELECT * FROM accounts WHERE user_id=?"
+SQL_GET_ACCOUNT = "SELECT * FROM accounts WHERE user_id=? AND account_id=?"
+SQL_UPDATE_BALANCE = "UPDATE accounts SET balance=? WHERE user_id=? AND account_id=?"
+SQL_DEBIT_BALANCE = "UPDATE accounts SET balance=balance-? WHERE user_id=? AND account_id=? AND balance>=?"
+SQL_GET_BALANCE = "SELECT balance FROM accounts WHERE user_id=? AND account_id=?"
+SQL_RECENT_TRANSACTIONS = "SELECT * FROM transactions WHERE user_id=? AND account_id=? ORDER BY date DESC LIMIT ?"
+SQL_INSERT_TRANSACTION = (
+    "INSERT INTO transactions (user_id, account_id, transaction_id, date, amount, description, merchant, category) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_GET_TRANSACTION = "SELECT * FROM transactions WHERE user_id=? AND account_id=? AND transaction_id=?"
+SQL_FIND_PAYEE = "SELECT * FROM payees WHERE user_id=? AND name=?"
+SQL_INSERT_PAYEE = "INSERT INTO payees (user_id, payee_id, name, account_number, address) VALUES (?,?,?,?,?)"
+SQL_GET_PAYEE = "SELECT * FROM payees WHERE user_id=? AND payee_id=?"
+
+# Rows come back as sqlite3.Row (built in C); callers get plain dicts
+def _row_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+    return dict(row) if row is not None else None
+
+def _row_dicts(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    return [dict(r) for r in rows]
 
 def _set_pragmas(conn: sqlite3.Connection):
     # Improve concurrency and reduce lock contention
@@ -15,18 +43,134 @@ def _set_pragmas(conn: sqlite3.Connection):
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.execute("PRAGMA busy_timeout=5000;")  # wait up to 5s if locked
     conn.execute("PRAGMA temp_store=MEMORY;")
-    # optional cache tuning
-    conn.execute("PRAGMA cache_size=-2000;")
+    # cache/mmap tuning (matches scripts/seed_sqlite.py)
+    conn.execute("PRAGMA cache_size=-65536;")
+    conn.execute("PRAGMA mmap_size=268435456;")
+
+class _PooledConnection(sqlite3.Connection):
+    """Weak-referenceable connection, so close_pool() can reach every open one."""
+
+# Idle connections per db path, shared by every thread and greenthread (a threading.local
+# pool gives each eventlet greenthread its own connection, so nothing was reused). A
+# checkout takes an idle connection or opens one; at most POOL_SIZE are kept idle
+POOL_SIZE = 16
+_pools: Dict[str, queue.LifoQueue] = {}
+_open_conns = weakref.WeakSet()
+_pool_lock = threading.Lock()
+_pool_generation = 0
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # timeout is for acquiring locks; busy_timeout pragma is set too
+    conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False,
+                           factory=_PooledConnection, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    _set_pragmas(conn)
+    with _pool_lock:
+        _open_conns.add(conn)
+    return conn
+
+@contextlib.contextmanager
+def get_pooled_conn(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Check out a connection; like "with conn" it commits or rolls back on exit, then goes back to the pool."""
+    with _pool_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        generation = _pool_generation
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _connect(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        # Connections checked out across close_pool() were closed by it
+        if generation == _pool_generation:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+def close_pool():
+    """Close every pooled connection (idle or checked out); later calls reconnect."""
+    global _pool_generation
+    with _pool_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+        _pools.clear()
+        _pool_generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+# Indexes the hot queries rely on; created at startup so databases seeded before they
+# were added to scripts/seed_sqlite.py get them too (no-ops otherwise)
+INDEXES = (
+    # Covering index for recent-transactions reads (ORDER BY date DESC LIMIT n walks the index)
+    "CREATE INDEX IF NOT EXISTS idx_tx_user_account_date ON transactions(user_id, account_id, date DESC, amount, merchant)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_user_account_txid ON transactions(user_id, account_id, transaction_id)",
+    "CREATE INDEX IF NOT EXISTS idx_accounts_user ON accounts(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_payees_user_name ON payees(user_id, name)",
+)
+
+_indexed_paths = set()
 
-def _retry_locked(fn, retries: int = 5, base_delay: float = 0.1):
+def ensure_indexes(db_path: str) -> None:
+    """Create INDEXES once per process and database."""
+    if db_path in _indexed_paths:
+        return
+    with get_pooled_conn(db_path) as c:
+        for stmt in INDEXES:
+            c.execute(stmt)
+    _indexed_paths.add(db_path)
+
+def _new_id(prefix: str) -> str:
+    # Random, not a millisecond timestamp: writes in the same batch or millisecond would share it
+    return f"{prefix}-{uuid.uuid4().hex}"
+
+# INSERT ... RETURNING (SQLite >= 3.35) hands back the new row without a second SELECT
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# REAL columns; RETURNING can hand back whole values as int (-100 rather than -100.0)
+_REAL_COLUMNS = ('amount', 'balance')
+
+def _insert_returning(conn: sqlite3.Connection, insert_sql: str, params: tuple,
+                      select_sql: str, select_params: tuple) -> Optional[Dict[str, Any]]:
+    if _HAS_RETURNING:
+        row = _row_dict(conn.execute(insert_sql + " RETURNING *", params).fetchone())
+    else:
+        conn.execute(insert_sql, params)
+        row = _row_dict(conn.execute(select_sql, select_params).fetchone())
+    if row:
+        for k in _REAL_COLUMNS:
+            if row.get(k) is not None:
+                row[k] = float(row[k])
+    return row
+
+# Backoff for "database is locked": exponential with jitter, each sleep capped
+MAX_RETRY_DELAY = 0.5
+# Total seconds a write may spend retrying a locked database (each attempt can also
+# wait out busy_timeout); keeps callers well inside the MCP client's call timeout
+LOCK_RETRY_BUDGET = 10.0
+
+def _retry_locked(fn, retries: int = 5, base_delay: float = 0.1, deadline: Optional[float] = None):
+    """deadline is a time.monotonic() value; no retry sleeps past it."""
     last = None
     for attempt in range(retries):
         try:
             return fn()
         except sqlite3.OperationalError as e:
             if "locked" in str(e).lower():
-                time.sleep(base_delay * (2 ** attempt))
                 last = e
+                if attempt == retries - 1:
+                    break
+                delay = min(base_delay * (1 << attempt) + random.random() * 0.05, MAX_RETRY_DELAY)
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    break
+                time.sleep(delay)
                 continue
             raise
     if last:
@@ -35,88 +179,106 @@ def _retry_locked(fn, retries: int = 5, base_delay: float = 0.1):
 class SqliteBankDataService:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        try:
+            ensure_indexes(db_path)
+        except sqlite3.OperationalError as e:
+            # e.g. tables not created yet; scripts/seed_sqlite.py creates the same indexes
+            logger.warning(f"Could not ensure SQLite indexes: {e}")
 
     def _conn(self):
-        # timeout here is for acquiring locks; also set busy_timeout pragma above
-        conn = sqlite3.connect(self.db_path, timeout=10)
-        conn.row_factory = _dict_factory
-        _set_pragmas(conn)
-        return conn
+        # Pooled; "with self._conn() as c" commits/rolls back, then returns it to the pool
+        return get_pooled_conn(self.db_path)
+
+    def execute_pragma(self, pragma: str) -> List[Dict[str, Any]]:
+        with self._conn() as c:
+            return _row_dicts(c.execute(f"PRAGMA {pragma};").fetchall())
+
+    def run_maintenance(self):
+        # Keep the -wal file bounded and planner stats fresh
+        self.execute_pragma("wal_checkpoint(TRUNCATE)")
+        self.execute_pragma("optimize")
 
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         with self._conn() as c:
-            r = c.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
-            return r
+            return _row_dict(c.execute(SQL_GET_USER, (user_id,)).fetchone())
 
     def get_accounts(self, user_id: str) -> List[Dict[str, Any]]:
         with self._conn() as c:
-            return c.execute("SELECT * FROM accounts WHERE user_id=?", (user_id,)).fetchall()
+            return _row_dicts(c.execute(SQL_GET_ACCOUNTS, (user_id,)).fetchall())
 
     def get_account(self, user_id: str, account_id: str) -> Optional[Dict[str, Any]]:
         with self._conn() as c:
-            return c.execute("SELECT * FROM accounts WHERE user_id=? AND account_id=?", (user_id, account_id)).fetchone()
+            return _row_dict(c.execute(SQL_GET_ACCOUNT, (user_id, account_id)).fetchone())
 
     def update_account_balance(self, user_id: str, account_id: str, new_balance: float) -> bool:
         def _do():
             with self._conn() as c:
-                cur = c.execute("UPDATE accounts SET balance=? WHERE user_id=? AND account_id=?", (float(new_balance), user_id, account_id))
+                cur = c.execute(SQL_UPDATE_BALANCE, (float(new_balance), user_id, account_id))
                 return cur.rowcount > 0
-        return _retry_locked(_do)
+        return _retry_locked(_do, deadline=time.monotonic() + LOCK_RETRY_BUDGET)
 
     def get_recent_transactions(self, user_id: str, account_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         with self._conn() as c:
-            return c.execute(
-                "SELECT * FROM transactions WHERE user_id=? AND account_id=? ORDER BY date DESC LIMIT ?",
-                (user_id, account_id, limit)
-            ).fetchall()
+            limit = int(limit)
+            cur = c.execute(SQL_RECENT_TRANSACTIONS, (user_id, account_id, limit))
+            if limit < 1:
+                # LIMIT 0 is no rows and a negative LIMIT is no limit; leave that to SQLite
+                return _row_dicts(cur.fetchall())
+            # LIMIT bounds the result; fetch it in one batch
+            cur.arraysize = limit
+            return _row_dicts(cur.fetchmany())
 
     def add_transaction(self, user_id: str, account_id: str, amount: float, description: str,
                         merchant: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
         def _do():
             with self._conn() as c:
-                tx_id = f"T-{int(datetime.now(timezone.utc).timestamp()*1000)}"
-                c.execute(
-                    """INSERT INTO transactions (user_id, account_id, transaction_id, date, amount, description, merchant, category)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (user_id, account_id, tx_id, datetime.now(timezone.utc).isoformat(), float(amount), description, merchant, category or 'general')
+                now = datetime.now(timezone.utc).isoformat()
+                tx_id = _new_id("T")
+                return _insert_returning(
+                    c,
+                    SQL_INSERT_TRANSACTION,
+                    (user_id, account_id, tx_id, now, float(amount), description, merchant, category or 'general'),
+                    SQL_GET_TRANSACTION,
+                    (user_id, account_id, tx_id)
                 )
-                return c.execute("SELECT * FROM transactions WHERE user_id=? AND account_id=? AND transaction_id=?",
-                                 (user_id, account_id, tx_id)).fetchone()
-        return _retry_locked(_do)
+        return _retry_locked(_do, deadline=time.monotonic() + LOCK_RETRY_BUDGET)
 
     def find_payee_by_name(self, user_id: str, name: str) -> Optional[Dict[str, Any]]:
         with self._conn() as c:
-            return c.execute("SELECT * FROM payees WHERE user_id=? AND name=?", (user_id, name)).fetchone()
+            return _row_dict(c.execute(SQL_FIND_PAYEE, (user_id, name)).fetchone())
 
     def create_payee(self, user_id: str, name: str, account_number: str, address: str = "") -> Dict[str, Any]:
         def _do():
             with self._conn() as c:
-                payee_id = f"P-{int(datetime.now(timezone.utc).timestamp()*1000)}"
-                c.execute(
-                    "INSERT INTO payees (user_id, payee_id, name, account_number, address) VALUES (?,?,?,?,?)",
-                    (user_id, payee_id, name, account_number, address)
+                payee_id = _new_id("P")
+                return _insert_returning(
+                    c,
+                    SQL_INSERT_PAYEE,
+                    (user_id, payee_id, name, account_number, address),
+                    SQL_GET_PAYEE,
+                    (user_id, payee_id)
                 )
-                return c.execute("SELECT * FROM payees WHERE user_id=? AND payee_id=?", (user_id, payee_id)).fetchone()
-        return _retry_locked(_do)
+        return _retry_locked(_do, deadline=time.monotonic() + LOCK_RETRY_BUDGET)
 
     def process_payment(self, user_id: str, from_account_id: str, payee_name: str, amount: float, memo: str = "Bill Payment") -> Dict[str, Any]:
         def _do():
             with self._conn() as c:
-                acc = c.execute("SELECT * FROM accounts WHERE user_id=? AND account_id=?", (user_id, from_account_id)).fetchone()
-                if not acc:
-                    return {'success': False, 'error': 'Account not found'}
-                balance = float(acc.get('balance', 0.0))
-                if balance < amount:
-                    return {'success': False, 'error': 'Insufficient funds'}
-                new_balance = balance - amount
-                c.execute("UPDATE accounts SET balance=? WHERE user_id=? AND account_id=?", (new_balance, user_id, from_account_id))
-                tx_id = f"T-{int(datetime.now(timezone.utc).timestamp()*1000)}"
-                c.execute(
-                    """INSERT INTO transactions (user_id, account_id, transaction_id, date, amount, description, merchant, category)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (user_id, from_account_id, tx_id, datetime.now(timezone.utc).isoformat(), -float(amount), memo, payee_name, 'bill-payment')
+                # Take the write lock up front (no shared->reserved upgrade) and debit only if
+                # funds suffice, so the check and the update can't interleave with another writer
+                c.execute("BEGIN IMMEDIATE")
+                cur = c.execute(SQL_DEBIT_BALANCE, (float(amount), user_id, from_account_id, float(amount)))
+                if cur.rowcount != 1:
+                    acc = c.execute(SQL_GET_ACCOUNT, (user_id, from_account_id)).fetchone()
+                    return {'success': False, 'error': 'Account not found' if not acc else 'Insufficient funds'}
+                new_balance = c.execute(SQL_GET_BALANCE, (user_id, from_account_id)).fetchone()['balance']
+                now = datetime.now(timezone.utc).isoformat()
+                tx_id = _new_id("T")
+                tx = _insert_returning(
+                    c,
+                    SQL_INSERT_TRANSACTION,
+                    (user_id, from_account_id, tx_id, now, -float(amount), memo, payee_name, 'bill-payment'),
+                    SQL_GET_TRANSACTION,
+                    (user_id, from_account_id, tx_id)
                 )
-                tx = c.execute("SELECT * FROM transactions WHERE user_id=? AND account_id=? AND transaction_id=?",
-                               (user_id, from_account_id, tx_id)).fetchone()
                 return {'success': True, 'new_balance': new_balance, 'transaction': tx}
-        return _retry_locked(_do)
\ No newline at end of file
+        return _retry_locked(_do, deadline=time.monotonic() + LOCK_RETRY_BUDGET)
\ No newline at end of file
@@ -7,48 +7,213 @@ Run manually:
 Env:
   SQLITE_DB_PATH  (defaults to ./data/banking.db)
 """
+import asyncio
+import contextlib
+import functools
+import inspect
 import os
+import queue
+import random
 import sqlite3
+import threading
 import time
-from typing import List, Dict, Any, Optional
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional
 from datetime import datetime, timezone
 
+import orjson
+
 # Minimal MCP server using fastmcp
 try:
     from mcp.server.fastmcp import FastMCP
 except ImportError as e:
     raise SystemExit("mcp package is required for MCP server. pip install mcp") from e
 
-def _dict_factory(cursor, row):
-    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+# SQL used on every call, kept as constants so the per-connection statement cache
+# (cached_statements) hits on the same text
+SQL_GET_USER = "SELECT * FROM users WHERE id=?"
+SQL_GET_ACCOUNTS = "SELECT * FROM accounts WHERE user_id=?"
+SQL_GET_ACCOUNT = "SELECT * FROM accounts WHERE user_id=? AND account_id=?"
+SQL_UPDATE_BALANCE = "UPDATE accounts SET balance=? WHERE user_id=? AND account_id=?"
+SQL_DEBIT_BALANCE = "UPDATE accounts SET balance=balance-? WHERE user_id=? AND account_id=? AND balance>=?"
+SQL_GET_BALANCE = "SELECT balance FROM accounts WHERE user_id=? AND account_id=?"
+SQL_RECENT_TRANSACTIONS = "SELECT * FROM transactions WHERE user_id=? AND account_id=? ORDER BY date DESC LIMIT ?"
+SQL_INSERT_TRANSACTION = (
+    "INSERT INTO transactions (user_id, account_id, transaction_id, date, amount, description, merchant, category) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_GET_TRANSACTION = "SELECT * FROM transactions WHERE user_id=? AND account_id=? AND transaction_id=?"
+SQL_FIND_PAYEE = "SELECT * FROM payees WHERE user_id=? AND name=?"
+
+# Rows come back as sqlite3.Row (built in C); callers get plain dicts
+def _row_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+    return dict(row) if row is not None else None
+
+def _row_dicts(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    return [dict(r) for r in rows]
 
 def _set_pragmas(conn: sqlite3.Connection):
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.execute("PRAGMA busy_timeout=5000;")
     conn.execute("PRAGMA temp_store=MEMORY;")
-    conn.execute("PRAGMA cache_size=-2000;")
+    conn.execute("PRAGMA cache_size=-65536;")
+    conn.execute("PRAGMA mmap_size=268435456;")
 
-def get_conn(db_path: str):
-    conn = sqlite3.connect(db_path, timeout=10)
-    conn.row_factory = _dict_factory
+class _PooledConnection(sqlite3.Connection):
+    """Weak-referenceable connection, so close_pool() can reach every open one."""
+
+# Idle connections per db path, shared by every thread and greenthread (a threading.local
+# pool gives each eventlet greenthread its own connection, so nothing was reused). A
+# checkout takes an idle connection or opens one; at most POOL_SIZE are kept idle
+POOL_SIZE = 16
+_pools: Dict[str, queue.LifoQueue] = {}
+_open_conns = weakref.WeakSet()
+_pool_lock = threading.Lock()
+_pool_generation = 0
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # timeout is for acquiring locks; busy_timeout pragma is set too
+    conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False,
+                           factory=_PooledConnection, cached_statements=256)
+    conn.row_factory = sqlite3.Row
     _set_pragmas(conn)
+    with _pool_lock:
+        _open_conns.add(conn)
     return conn
 
-def _retry_locked(fn, retries: int = 5, base_delay: float = 0.1):
+@contextlib.contextmanager
+def get_pooled_conn(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Check out a connection; like "with conn" it commits or rolls back on exit, then goes back to the pool."""
+    with _pool_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        generation = _pool_generation
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _connect(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        # Connections checked out across close_pool() were closed by it
+        if generation == _pool_generation:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+def close_pool():
+    """Close every pooled connection (idle or checked out); later calls reconnect."""
+    global _pool_generation
+    with _pool_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+        _pools.clear()
+        _pool_generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+def get_conn(db_path: str):
+    return get_pooled_conn(db_path)
+
+# Indexes the hot queries rely on; created at startup so databases seeded before they
+# were added to scripts/seed_sqlite.py get them too (no-ops otherwise)
+INDEXES = (
+    # Covering index for recent-transactions reads (ORDER BY date DESC LIMIT n walks the index)
+    "CREATE INDEX IF NOT EXISTS idx_tx_user_account_date ON transactions(user_id, account_id, date DESC, amount, merchant)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_user_account_txid ON transactions(user_id, account_id, transaction_id)",
+    "CREATE INDEX IF NOT EXISTS idx_accounts_user ON accounts(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_payees_user_name ON payees(user_id, name)",
+)
+
+_indexed_paths = set()
+
+def ensure_indexes(db_path: str) -> None:
+    """Create INDEXES once per process and database."""
+    if db_path in _indexed_paths:
+        return
+    with get_pooled_conn(db_path) as c:
+        for stmt in INDEXES:
+            c.execute(stmt)
+    _indexed_paths.add(db_path)
+
+def _new_id(prefix: str) -> str:
+    # Random, not a millisecond timestamp: writes in the same batch or millisecond would share it
+    return f"{prefix}-{uuid.uuid4().hex}"
+
+# INSERT ... RETURNING (SQLite >= 3.35) hands back the new row without a second SELECT
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# REAL columns; RETURNING can hand back whole values as int (-100 rather than -100.0)
+_REAL_COLUMNS = ('amount', 'balance')
+
+def _insert_returning(conn: sqlite3.Connection, insert_sql: str, params: tuple,
+                      select_sql: str, select_params: tuple) -> Optional[Dict[str, Any]]:
+    if _HAS_RETURNING:
+        row = _row_dict(conn.execute(insert_sql + " RETURNING *", params).fetchone())
+    else:
+        conn.execute(insert_sql, params)
+        row = _row_dict(conn.execute(select_sql, select_params).fetchone())
+    if row:
+        for k in _REAL_COLUMNS:
+            if row.get(k) is not None:
+                row[k] = float(row[k])
+    return row
+
+# Backoff for "database is locked": exponential with jitter, each sleep capped
+MAX_RETRY_DELAY = 0.5
+# Total seconds a write may spend retrying a locked database (each attempt can also
+# wait out busy_timeout); keeps callers well inside the MCP client's call timeout
+LOCK_RETRY_BUDGET = 10.0
+
+def _retry_locked(fn, retries: int = 5, base_delay: float = 0.1, deadline: Optional[float] = None):
+    """deadline is a time.monotonic() value; no retry sleeps past it."""
     last = None
     for attempt in range(retries):
         try:
             return fn()
         except sqlite3.OperationalError as e:
             if "locked" in str(e).lower():
-                time.sleep(base_delay * (2 ** attempt))
                 last = e
+                if attempt == retries - 1:
+                    break
+                delay = min(base_delay * (1 << attempt) + random.random() * 0.05, MAX_RETRY_DELAY)
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    break
+                time.sleep(delay)
                 continue
             raise
     if last:
         raise last
 
+# SQLite work runs off the event loop; each worker checks out its own pooled connection,
+# so concurrent reads proceed in parallel under WAL
+DB_EXEC = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 2), thread_name_prefix="sqlite")
+
+def _db_tool(fn):
+    """
+    Expose a sync SQLite function as an async tool: the body and the orjson encoding of
+    its return value run on DB_EXEC, and FastMCP gets the JSON text as-is (the client
+    decodes it).
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(DB_EXEC, lambda: orjson.dumps(fn(*args, **kwargs)).decode())
+    # wraps() copies fn's annotations and inspect.signature() follows __wrapped__; advertise
+    # the real str return so FastMCP doesn't build a structured-output schema for fn's type
+    wrapper.__signature__ = inspect.signature(fn).replace(return_annotation=str)
+    wrapper.__annotations__ = {**fn.__annotations__, 'return': str}
+    return wrapper
+
 DB_PATH = os.environ.get('SQLITE_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'banking.db'))
 server = FastMCP("sqlite-banking")
 
@@ -57,71 +222,138 @@ def ping() -> str:
     return "pong"
 
 @server.tool()
+@_db_tool
 def get_user(user_id: str) -> Optional[Dict[str, Any]]:
     with get_conn(DB_PATH) as c:
-        return c.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
+        return _row_dict(c.execute(SQL_GET_USER, (user_id,)).fetchone())
 
 @server.tool()
+@_db_tool
 def get_accounts(user_id: str) -> List[Dict[str, Any]]:
     with get_conn(DB_PATH) as c:
-        return c.execute("SELECT * FROM accounts WHERE user_id=?", (user_id,)).fetchall()
+        return _row_dicts(c.execute(SQL_GET_ACCOUNTS, (user_id,)).fetchall())
 
 @server.tool()
+@_db_tool
 def get_account(user_id: str, account_id: str) -> Optional[Dict[str, Any]]:
     with get_conn(DB_PATH) as c:
-        return c.execute("SELECT * FROM accounts WHERE user_id=? AND account_id=?", (user_id, account_id)).fetchone()
+        return _row_dict(c.execute(SQL_GET_ACCOUNT, (user_id, account_id)).fetchone())
 
 @server.tool()
+@_db_tool
 def get_recent_transactions(user_id: str, account_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     with get_conn(DB_PATH) as c:
-        return c.execute(
-            "SELECT * FROM transactions WHERE user_id=? AND account_id=? ORDER BY date DESC LIMIT ?",
-            (user_id, account_id, limit)
-        ).fetchall()
+        limit = int(limit)
+        cur = c.execute(SQL_RECENT_TRANSACTIONS, (user_id, account_id, limit))
+        if limit < 1:
+            # LIMIT 0 is no rows and a negative LIMIT is no limit; leave that to SQLite
+            return _row_dicts(cur.fetchall())
+        # LIMIT bounds the result; fetch it in one batch
+        cur.arraysize = limit
+        return _row_dicts(cur.fetchmany())
 
-@server.tool()
-def add_transaction(user_id: str, account_id: str, amount: float, description: str,
-                    merchant: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+# add_transaction calls arriving within TX_BATCH_WINDOW seconds (up to TX_BATCH_MAX)
+# are written in one transaction, i.e. one WAL commit for the whole burst
+TX_BATCH_MAX = 64
+TX_BATCH_WINDOW = 0.005
+_tx_queue: Optional[asyncio.Queue] = None
+_tx_batcher_task: Optional[asyncio.Task] = None
+
+def _insert_transaction_batch(rows: List[tuple]) -> List[Optional[Dict[str, Any]]]:
     def _do():
         with get_conn(DB_PATH) as c:
-            tx_id = f"T-{int(datetime.now(timezone.utc).timestamp()*1000)}"
-            c.execute(
-                """INSERT INTO transactions (user_id, account_id, transaction_id, date, amount, description, merchant, category)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (user_id, account_id, tx_id, datetime.now(timezone.utc).isoformat(), float(amount), description, merchant, category or 'general')
-            )
-            return c.execute("SELECT * FROM transactions WHERE user_id=? AND account_id=? AND transaction_id=?",
-                             (user_id, account_id, tx_id)).fetchone()
-    return _retry_locked(_do)
+            c.execute("BEGIN IMMEDIATE")
+            # Per-row INSERT ... RETURNING (not executemany) so each caller gets its own row back
+            return [
+                _insert_returning(c, SQL_INSERT_TRANSACTION, row, SQL_GET_TRANSACTION, row[:3])
+                for row in rows
+            ]
+    return _retry_locked(_do, deadline=time.monotonic() + LOCK_RETRY_BUDGET)
+
+async def _tx_batcher(queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + TX_BATCH_WINDOW
+        while len(batch) < TX_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            results = await loop.run_in_executor(DB_EXEC, _insert_transaction_batch, [row for row, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            continue
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
 
 @server.tool()
+async def add_transaction(user_id: str, account_id: str, amount: float, description: str,
+                          merchant: Optional[str] = None, category: Optional[str] = None) -> str:
+    global _tx_queue, _tx_batcher_task
+    loop = asyncio.get_running_loop()
+    if _tx_queue is None:
+        _tx_queue = asyncio.Queue()
+        _tx_batcher_task = loop.create_task(_tx_batcher(_tx_queue))
+    now = datetime.now(timezone.utc).isoformat()
+    tx_id = _new_id("T")
+    fut = loop.create_future()
+    await _tx_queue.put(((user_id, account_id, tx_id, now, float(amount), description, merchant, category or 'general'), fut))
+    return orjson.dumps(await fut).decode()
+
+@server.tool()
+@_db_tool
 def find_payee_by_name(user_id: str, name: str) -> Optional[Dict[str, Any]]:
     with get_conn(DB_PATH) as c:
-        return c.execute("SELECT * FROM payees WHERE user_id=? AND name=?", (user_id, name)).fetchone()
+        return _row_dict(c.execute(SQL_FIND_PAYEE, (user_id, name)).fetchone())
 
 @server.tool()
+@_db_tool
 def process_payment(user_id: str, from_account_id: str, payee_name: str, amount: float, memo: str = "Bill Payment") -> Dict[str, Any]:
     def _do():
         with get_conn(DB_PATH) as c:
-            acc = c.execute("SELECT * FROM accounts WHERE user_id=? AND account_id=?", (user_id, from_account_id)).fetchone()
-            if not acc:
-                return {'success': False, 'error': 'Account not found'}
-            balance = float(acc.get('balance', 0.0))
-            if balance < amount:
-                return {'success': False, 'error': 'Insufficient funds'}
-            new_balance = balance - amount
-            c.execute("UPDATE accounts SET balance=? WHERE user_id=? AND account_id=?", (new_balance, user_id, from_account_id))
-            tx_id = f"T-{int(datetime.now(timezone.utc).timestamp()*1000)}"
-            c.execute(
-                """INSERT INTO transactions (user_id, account_id, transaction_id, date, amount, description, merchant, category)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (user_id, from_account_id, tx_id, datetime.now(timezone.utc).isoformat(), -float(amount), memo, payee_name, 'bill-payment')
+            # Take the write lock up front (no shared->reserved upgrade) and debit only if
+            # funds suffice, so the check and the update can't interleave with another writer
+            c.execute("BEGIN IMMEDIATE")
+            cur = c.execute(SQL_DEBIT_BALANCE, (float(amount), user_id, from_account_id, float(amount)))
+            if cur.rowcount != 1:
+                acc = c.execute(SQL_GET_ACCOUNT, (user_id, from_account_id)).fetchone()
+                return {'success': False, 'error': 'Account not found' if not acc else 'Insufficient funds'}
+            new_balance = c.execute(SQL_GET_BALANCE, (user_id, from_account_id)).fetchone()['balance']
+            now = datetime.now(timezone.utc).isoformat()
+            tx_id = _new_id("T")
+            tx = _insert_returning(
+                c,
+                SQL_INSERT_TRANSACTION,
+                (user_id, from_account_id, tx_id, now, -float(amount), memo, payee_name, 'bill-payment'),
+                SQL_GET_TRANSACTION,
+                (user_id, from_account_id, tx_id)
             )
-            tx = c.execute("SELECT * FROM transactions WHERE user_id=? AND account_id=? AND transaction_id=?",
-                           (user_id, from_account_id, tx_id)).fetchone()
             return {'success': True, 'new_balance': new_balance, 'transaction': tx}
-    return _retry_locked(_do)
+    return _retry_locked(_do, deadline=time.monotonic() + LOCK_RETRY_BUDGET)
+
+def run_maintenance(db_path: str):
+    # Keep the -wal file bounded and planner stats fresh
+    with get_conn(db_path) as c:
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        c.execute("PRAGMA optimize;")
 
 if __name__ == "__main__":
+    try:
+        ensure_indexes(DB_PATH)
+        run_maintenance(DB_PATH)
+    except sqlite3.Error:
+        pass
     # Run over stdio per MCP spec
-    server.run_stdio()
\ No newline at end of file
+    try:
+        server.run_stdio()
+    finally:
+        DB_EXEC.shutdown(wait=True)
+        close_pool()
\ No newline at end of file
@@ -57,6 +57,9 @@ class BankingChatClient {
       const summaryPart = data.summary ? `<br><small class="text-muted">Summary: ${this.escapeHtml(data.summary)}</small>` : '';
       this.addSystemMessage(`Document "${this.escapeHtml(data.filename)}" processed.${summaryPart}`);
     });
+    this.socket.on('document_failed', (data) => {
+      this.addErrorMessage(`Failed to analyze "${this.escapeHtml(data.filename || 'document')}": ${this.escapeHtml(data.error || 'unknown error')}`);
+    });
   }
 
   registerUIEvents() {
@@ -176,6 +179,10 @@ class BankingChatClient {
       form.append('document', file);
       const res = await fetch('/api/analyze', { method: 'POST', body: form });
       const data = await res.json();
+      if (res.status === 202 && data.success) {
+        // Still processing server-side; 'document_processed' arrives over the socket
+        return;
+      }
       if (res.ok && data.success) {
         this.hasAnyDocument = true;
         this.selectedDocumentId = data.id;
@@ -0,0 +1,19 @@
+"""
+Tests run with the standard library runner from the repo root:
+  python -m unittest
+"""
+import contextlib
+import importlib.util
+import io
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def seed_database(db_path: str) -> None:
+    """Create the demo schema and data (scripts/seed_sqlite.py) at db_path."""
+    spec = importlib.util.spec_from_file_location("seed_sqlite", ROOT / "scripts" / "seed_sqlite.py")
+    seed = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(seed)
+    seed.DB_PATH = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        seed.main()
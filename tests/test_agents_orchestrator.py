@@ -0,0 +1,26 @@
+import unittest
+
+from services.agents_orchestrator import classify_intents
+
+class ClassifyIntentsTest(unittest.TestCase):
+    def test_informal_requests_are_routed(self):
+        self.assertEqual(classify_intents("what's my bal?"), {'balance'})
+        self.assertEqual(classify_intents("show my recent txns"), {'transactions'})
+        self.assertEqual(classify_intents("send $50 to ACME Utilities"), {'payment'})
+        self.assertEqual(classify_intents("transfer 200 to savings"), {'payment'})
+        self.assertEqual(classify_intents("xfr to CityNet Internet"), {'payment'})
+
+    def test_general_questions_reach_the_llm(self):
+        for message in (
+            "what is a wire transfer fee?",
+            "summarize my spending in this document",
+            "are my funds FDIC insured?",
+            "how long does a transfer take?",
+            "what am I owing on this invoice?",
+            "can I send money abroad?",
+        ):
+            with self.subTest(message=message):
+                self.assertEqual(classify_intents(message), set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from services.sqlite_data import SqliteBankDataService, close_pool
+from tests import seed_database
+
+USER = 'husamhilal'
+
+class SqliteBankDataServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.tmp.name, 'banking.db')
+        seed_database(db_path)
+        self.svc = SqliteBankDataService(db_path)
+
+    def tearDown(self):
+        close_pool()
+        self.tmp.cleanup()
+
+    def test_writes_in_the_same_millisecond_get_distinct_ids(self):
+        rows = [self.svc.add_transaction(USER, 'CHK-001', -1.0, f"tx {i}") for i in range(5)]
+        self.assertEqual(len({r['transaction_id'] for r in rows}), len(rows))
+        self.assertEqual([r['description'] for r in rows], [f"tx {i}" for i in range(5)])
+
+    def test_inserted_amounts_are_floats(self):
+        tx = self.svc.add_transaction(USER, 'CHK-001', -100, "whole amount")
+        self.assertIsInstance(tx['amount'], float)
+        paid = self.svc.process_payment(USER, 'CHK-001', 'ACME Utilities', 50)
+        self.assertTrue(paid['success'])
+        self.assertIsInstance(paid['transaction']['amount'], float)
+        self.assertEqual(paid['transaction']['amount'], -50.0)
+
+    def test_recent_transactions_follow_sqlite_limit_semantics(self):
+        txs = self.svc.get_recent_transactions(USER, 'CHK-001', limit=3)
+        self.assertEqual([t['transaction_id'] for t in txs], ['T-1', 'T-2', 'T-3'])
+        self.assertEqual(self.svc.get_recent_transactions(USER, 'CHK-001', limit=0), [])
+        self.assertEqual(len(self.svc.get_recent_transactions(USER, 'CHK-001', limit=-1)), 5)
+
+if __name__ == '__main__':
+    unittest.main()
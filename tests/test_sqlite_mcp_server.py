@@ -0,0 +1,42 @@
+import asyncio
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import orjson
+
+from tests import seed_database
+
+@unittest.skipUnless(importlib.util.find_spec("mcp"), "mcp package is not installed")
+class AddTransactionBatchTest(unittest.TestCase):
+    def setUp(self):
+        from services import sqlite_mcp_server as srv
+        self.srv = srv
+        self.tmp = tempfile.TemporaryDirectory()
+        srv.DB_PATH = os.path.join(self.tmp.name, 'banking.db')
+        seed_database(srv.DB_PATH)
+        # The batcher is bound to the loop that started it; each test runs its own loop
+        srv._tx_queue = None
+        srv._tx_batcher_task = None
+
+    def tearDown(self):
+        self.srv.close_pool()
+        self.tmp.cleanup()
+
+    def test_concurrent_calls_in_one_batch_get_distinct_ids(self):
+        async def run():
+            calls = [
+                self.srv.add_transaction('husamhilal', 'CHK-001', -float(i + 1), f"tx {i}")
+                for i in range(5)
+            ]
+            return [orjson.loads(r) for r in await asyncio.gather(*calls)]
+
+        rows = asyncio.run(run())
+        self.assertEqual(len({r['transaction_id'] for r in rows}), len(rows))
+        for i, row in enumerate(rows):
+            self.assertEqual(row['description'], f"tx {i}")
+            self.assertEqual(row['amount'], -float(i + 1))
+
+if __name__ == '__main__':
+    unittest.main()